@@ -1,57 +1,316 @@
 import pandas as pd
 import json
 import sys
+import os
+import hashlib
+import threading
+import socketserver
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
 
-def process_file(file_path):
-    try:
-        # Read the Excel file
-        df = pd.read_excel(file_path)
-
-        # Validate required columns
-
-    
-        # Aggregate data by Category and sum the Value column
-        aggregated_data = (
-            df.groupby("Category")["Value"]
-            .sum()
-            .reset_index()
-            .rename(columns={"Value": "value"})
-            .to_dict(orient="records")
-        )
-
-        # Calculate total sales
-        total_sales = df["Value"].sum()
-
-        # Convert all int64/float64 values to native Python types
-        def convert_to_native_types(data):
-            if isinstance(data, list):
-                return [convert_to_native_types(item) for item in data]
-            elif isinstance(data, dict):
-                return {k: convert_to_native_types(v) for k, v in data.items()}
-            elif hasattr(data, 'item'):  # For NumPy types like int64, float64
-                return data.item()
-            else:
-                return data
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet inputs need pyarrow
+    pq = None
+
+# Results of process_file kept by the worker, keyed on the file's fingerprint
+RESULT_CACHE_SIZE = int(os.environ.get("SCRIPT_RESULT_CACHE_SIZE", "64"))
+# Worker processes for requests with several changed files
+WORKER_PROCESSES = int(os.environ.get("SCRIPT_WORKER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# Rows read and aggregated at a time; memory use depends on this and the
+# number of categories, not on the size of the file
+CHUNK_ROWS = int(os.environ.get("SCRIPT_CHUNK_ROWS", "50000"))
+# In sheet_names, reads every sheet of a workbook
+ALL_SHEETS = "*"
+
+
+class SalesTotals:
+    # Running sum of Value per Category, and of all Values, updated chunk by
+    # chunk. Sums are kept as Python numbers: ints while every Value seen is
+    # an integer, floats as soon as one chunk has a fractional or missing
+    # Value (the dtype pandas would give the whole column).
 
-        # Prepare the result
-        result = {
-            "total_sales": total_sales,
-            "aggregated_data": [{"name": row["Category"], "value": row["value"]} for row in aggregated_data],
+    def __init__(self):
+        self.sums = {}  # category -> sum of Value
+        self.total = 0
+        self.floating = False
+
+    def add_chunk(self, categories, values):
+        values = pd.to_numeric(pd.Series(values), errors="coerce")
+        if values.dtype.kind == "f":
+            self.floating = True
+        self.total += values.sum().item()
+        # Rows without a Category only count towards the total, like groupby's dropna
+        sums = values.groupby(pd.Series(categories, dtype=object).to_numpy(), dropna=True, sort=False).sum()
+        for category, value in zip(sums.index.tolist(), sums.tolist()):
+            self.sums[category] = self.sums.get(category, 0) + value
+
+    def merge(self, other):
+        for category, value in other.sums.items():
+            self.sums[category] = self.sums.get(category, 0) + value
+        self.total += other.total
+        self.floating = self.floating or other.floating
+        return self
+
+    def result(self):
+        number = float if self.floating else (lambda value: value)
+        try:
+            names = sorted(self.sums)
+        except TypeError:  # Categories of mixed types
+            names = sorted(self.sums, key=str)
+        return {
+            "total_sales": number(self.total),
+            "aggregated_data": [{"name": name, "value": number(self.sums[name])} for name in names],
         }
 
-        # Convert to native Python types
-        result = convert_to_native_types(result)
+def iter_chunks(file_path, sheet_names=None, chunk_rows=CHUNK_ROWS):
+    # (categories, values) of at most chunk_rows rows at a time. Workbooks are
+    # read row by row in read-only mode, CSV and Parquet in chunks of rows,
+    # and only the Category and Value columns are ever kept.
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        for chunk in pd.read_csv(file_path, usecols=lambda column: column in ("Category", "Value"), chunksize=chunk_rows):
+            yield chunk["Category"].to_numpy(), chunk["Value"].to_numpy()
+    elif extension == ".parquet":
+        if pq is None:
+            raise RuntimeError("Reading Parquet files needs pyarrow installed")
+        for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows, columns=["Category", "Value"]):
+            chunk = batch.to_pandas()
+            yield chunk["Category"].to_numpy(), chunk["Value"].to_numpy()
+    elif extension in (".xlsx", ".xlsm"):
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheets = workbook.sheetnames if sheet_names and ALL_SHEETS in sheet_names else (sheet_names or workbook.sheetnames[:1])
+            for sheet in sheets:
+                rows = workbook[sheet].iter_rows(values_only=True)
+                # The header is the first non-empty row, like excel_stream.read_excel_streaming
+                header = next((row for row in rows if any(value is not None for value in row)), ())
+                header = [None if value is None else str(value) for value in header]
+                for column in ("Category", "Value"):
+                    if column not in header:
+                        raise KeyError(column)
+                category_at, value_at = header.index("Category"), header.index("Value")
+                categories, values = [], []
+                blank_rows = 0  # Held back until a non-empty row shows they aren't trailing
+                for row in rows:
+                    if all(value is None for value in row):
+                        blank_rows += 1
+                        continue
+                    categories.extend([None] * blank_rows)
+                    values.extend([None] * blank_rows)
+                    blank_rows = 0
+                    categories.append(row[category_at] if category_at < len(row) else None)
+                    values.append(row[value_at] if value_at < len(row) else None)
+                    if len(categories) >= chunk_rows:
+                        yield categories, values
+                        categories, values = [], []
+                if categories:
+                    yield categories, values
+        finally:
+            workbook.close()
+    else:
+        # Formats openpyxl can't stream (.xls, .ods) are read whole
+        sheets = None if sheet_names and ALL_SHEETS in sheet_names else (sheet_names or [0])
+        for df in pd.read_excel(file_path, sheet_name=sheets).values():
+            yield df["Category"].to_numpy(), df["Value"].to_numpy()
+
+def aggregate_file(file_path, sheet_names=None):
+    totals = SalesTotals()
+    for categories, values in iter_chunks(file_path, sheet_names):
+        totals.add_chunk(categories, values)
+    return totals
 
+def summarize_file(file_path, sheet_names=None):
+    # Aggregate data by Category and sum the Value column, plus the total sales,
+    # as native Python numbers
+    return aggregate_file(file_path, sheet_names).result()
+
+def process_file(file_path, sheet_names=None):
+    try:
         # Return the result as JSON
-        return json.dumps(result)
+        return json.dumps(summarize_file(file_path, sheet_names))
+
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+def process_files(file_paths, sheet_names=None):
+    # One result for several files (and sheets), as if they were one table
+    try:
+        totals = SalesTotals()
+        for file_path in file_paths:
+            totals.merge(aggregate_file(file_path, sheet_names))
+        return json.dumps(totals.result())
 
     except Exception as e:
         return json.dumps({"error": str(e)})
 
+# path -> (mtime, size, content hash) of the last time the file was hashed
+_digests = {}
+
+def file_fingerprint(file_path):
+    # (path, size, content hash): touching a file or saving it unchanged keeps
+    # its fingerprint, so the cached result is still used. The mtime only
+    # decides when the file is read and hashed again (its mtime or size changed
+    # since the last hash); a same-size save within one mtime tick isn't seen.
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    known = _digests.get(path)
+    if known is None or known[:2] != (stat.st_mtime_ns, stat.st_size):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        known = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+        _digests[path] = known
+    return (path, stat.st_size, known[2])
+
+
+class Worker:
+    # Long-lived process_file: pandas stays imported, unchanged files are
+    # answered from the cache, and changed files of one request are read in
+    # parallel worker processes.
+
+    def __init__(self, cache_size=RESULT_CACHE_SIZE, processes=WORKER_PROCESSES):
+        self.cache_size = cache_size
+        self.processes = processes
+        self.cache = OrderedDict()  # (fingerprint, sheets) -> SalesTotals or {"error": ...}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _aggregate_many(self, paths, sheet_names):
+        if len(paths) < 2 or self.processes < 2:
+            futures = None
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.processes)
+            futures = [self._pool.submit(aggregate_file, path, sheet_names) for path in paths]
+        results = []
+        for i, path in enumerate(paths):
+            try:
+                results.append(futures[i].result() if futures else aggregate_file(path, sheet_names))
+            except Exception as e:
+                results.append({"error": str(e)})
+        return results
+
+    def aggregate_files(self, file_paths, sheet_names=None):
+        # [(SalesTotals or {"error": ...}, served from cache)] per file
+        results = [None] * len(file_paths)
+        sheets = tuple(sheet_names or ())
+        pending = {}  # cache key -> indexes of the files that need reading
+        for i, file_path in enumerate(file_paths):
+            try:
+                key = (file_fingerprint(file_path), sheets)
+            except Exception as e:
+                results[i] = ({"error": str(e)}, False)
+                continue
+            with self._lock:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.cache.move_to_end(key)
+                    self.hits += 1
+            if cached is not None:
+                results[i] = (cached, True)
+            else:
+                pending.setdefault(key, []).append(i)
+
+        keys = list(pending)
+        for key, totals in zip(keys, self._aggregate_many([key[0][0] for key in keys], sheet_names)):
+            with self._lock:
+                self.misses += 1
+                self.cache[key] = totals
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            for i in pending[key]:
+                results[i] = (totals, False)
+        return results
+
+    def process_files(self, file_paths, sheet_names=None):
+        return [
+            {"file": file_path, "cached": cached, "result": totals if isinstance(totals, dict) else totals.result()}
+            for file_path, (totals, cached) in zip(file_paths, self.aggregate_files(file_paths, sheet_names))
+        ]
+
+    def combine_files(self, file_paths, sheet_names=None):
+        combined = SalesTotals()
+        results = self.aggregate_files(file_paths, sheet_names)
+        for file_path, (totals, cached) in zip(file_paths, results):
+            if isinstance(totals, dict):
+                return {"error": f"{file_path}: {totals['error']}"}
+            combined.merge(totals)
+        return combined.result()
+
+    def handle(self, line):
+        # One JSON request line -> one JSON response line:
+        #   {"id": 1, "files": ["a.xlsx", "b.csv"]}                  -> {"id": 1, "results": [...]} (one per file)
+        #   {"id": 2, "files": [...], "combine": true, "sheets": ["*"]} -> {"id": 2, "result": {...}} (all files together)
+        #   {"id": 3, "op": "stats"}                                 -> {"id": 3, "entries": ..., "hits": ..., "misses": ...}
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            if request.get("op") == "stats":
+                return json.dumps({"id": request_id, "entries": len(self.cache), "hits": self.hits, "misses": self.misses})
+            files = request.get("files") or ([request["file"]] if "file" in request else [])
+            sheets = request.get("sheets")
+            if request.get("combine"):
+                return json.dumps({"id": request_id, "result": self.combine_files(files, sheets)})
+            return json.dumps({"id": request_id, "results": self.process_files(files, sheets)})
+        except Exception as e:
+            return json.dumps({"error": str(e)})
+
+    def serve_stdio(self):
+        for line in sys.stdin:
+            if line.strip():
+                sys.stdout.write(self.handle(line) + "\n")
+                sys.stdout.flush()
+
+    def serve_socket(self, port):
+        # Same JSON-lines protocol on 127.0.0.1:port, one thread per connection
+        worker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if line.strip():
+                        self.wfile.write((worker.handle(line) + "\n").encode())
+                        self.wfile.flush()
+
+        socketserver.ThreadingTCPServer.daemon_threads = True
+        with socketserver.ThreadingTCPServer(("127.0.0.1", port), Handler) as server:
+            print(json.dumps({"listening": server.server_address[1]}), flush=True)
+            server.serve_forever()
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print(json.dumps({"error": "Usage: script.py <file_path>"}))
+    # script.py <file_path>                  one file, one JSON result (the original interface)
+    # script.py <file_path> <file_path> ...  several files aggregated into one result
+    #     --sheet NAME (repeatable) or --all-sheets picks the workbook sheets (default: the first)
+    # script.py --worker                     JSON-lines requests on stdin, responses on stdout
+    # script.py --worker --port N            the same protocol on a local TCP socket (0 = any free port)
+    if len(sys.argv) >= 2 and sys.argv[1] == "--worker":
+        if len(sys.argv) == 4 and sys.argv[2] == "--port":
+            Worker().serve_socket(int(sys.argv[3]))
+        else:
+            Worker().serve_stdio()
+        sys.exit(0)
+
+    args = sys.argv[1:]
+    file_paths, sheet_names = [], []
+    while args:
+        arg = args.pop(0)
+        if arg == "--sheet" and args:
+            sheet_names.append(args.pop(0))
+        elif arg == "--all-sheets":
+            sheet_names.append(ALL_SHEETS)
+        else:
+            file_paths.append(arg)
+
+    if not file_paths:
+        print(json.dumps({"error": "Usage: script.py <file_path> [<file_path> ...] [--sheet NAME | --all-sheets] | script.py --worker [--port N]"}))
         sys.exit(1)
 
-    file_path = sys.argv[1]
-    print(process_file(file_path))
+    if len(file_paths) == 1:
+        print(process_file(file_paths[0], sheet_names or None))
+    else:
+        print(process_files(file_paths, sheet_names or None))
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+
+# Synthetic sheets shaped like the ones get_data reads, with cells as text the
+# way the Sheets API returns them:
+#   googlesheet1: Date / Gold Price ("1,234.56") / Housing Price
+#   googlesheet2: Sector / Sym / Market Cap
+#   googlesheet3: Sector / Sym / % Stock Weight ("3.45%")
+# Everything is vectorized so 10M-row frames take seconds, not minutes.
+
+SECTORS = [
+    "Communication Services", "Consumer Discretionary", "Consumer Staples", "Energy",
+    "Financials", "Health Care", "Industrials", "Information Technology",
+    "Materials", "Real Estate", "Utilities",
+]
+# One row per sheet is left out for the header
+EXCEL_MAX_ROWS = 1048575
+
+
+def _decimal_text(cents: np.ndarray, thousands_separator: bool = False) -> np.ndarray:
+    # Integer hundredths -> "1234.56", or "1,234.56" with the separator
+    whole = (cents // 100).astype(np.int64)
+    fraction = np.char.zfill((cents % 100).astype(str), 2)
+    if thousands_separator:
+        with_comma = np.char.add(np.char.add((whole // 1000).astype(str), ","), np.char.zfill((whole % 1000).astype(str), 3))
+        whole_text = np.where(whole >= 1000, with_comma, whole.astype(str))
+    else:
+        whole_text = whole.astype(str)
+    return np.char.add(np.char.add(whole_text, "."), fraction)
+
+
+def price_trend_frame(rows: int, seed: int = 0, bad_date_every: int = 97, years: int = 30) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Rows are spread evenly over `years` years, several rows per day once rows > days
+    days = (np.arange(rows, dtype=np.int64) * (years * 365)) // max(rows, 1)
+    dates = np.datetime_as_string(np.datetime64("1995-01-01") + days.astype("timedelta64[D]"), unit="D").astype(object)
+    if bad_date_every:
+        dates[bad_date_every - 1::bad_date_every] = "bad-date"
+    return pd.DataFrame({
+        "Date": dates,
+        "Gold Price": _decimal_text(rng.integers(20000, 250000, rows), thousands_separator=True).astype(object),
+        "Housing Price": rng.integers(100000, 500000, rows).astype(str).astype(object),
+    })
+
+
+def _symbols(rows: int) -> np.ndarray:
+    return np.char.add("S", np.char.zfill(np.arange(rows).astype(str), 7)).astype(object)
+
+
+def _sectors(rows: int) -> np.ndarray:
+    return np.array(SECTORS, dtype=object)[np.arange(rows) % len(SECTORS)]
+
+
+def sp500_frame(rows: int, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Sector": _sectors(rows),
+        "Sym": _symbols(rows),
+        "Market Cap": rng.integers(1000, 900000, rows).astype(str).astype(object),
+    })
+
+
+def stocks_frame(rows: int, seed: int = 2) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    weights = np.char.add(_decimal_text(rng.integers(1, 700, rows)), "%")
+    return pd.DataFrame({
+        "Sector": _sectors(rows),
+        "Sym": _symbols(rows),
+        "% Stock Weight": weights.astype(object),
+    })
+
+
+def to_values(df: pd.DataFrame) -> list[list]:
+    # Header + rows, as values().get returns them
+    return [list(df.columns)] + df.to_numpy().tolist()
+
+
+def write_xlsx(df: pd.DataFrame, path: str) -> list[str]:
+    # Typed cells (dates, numbers) like a hand-made workbook; frames longer
+    # than Excel's row limit are split over several sheets
+    typed = pd.DataFrame({
+        "Date": pd.to_datetime(df["Date"], errors="coerce"),
+        "Gold Price": pd.to_numeric(df["Gold Price"].str.replace(",", ""), errors="coerce"),
+        "Housing Price": pd.to_numeric(df["Housing Price"], errors="coerce"),
+    })
+    workbook = Workbook(write_only=True)
+    sheet_names = []
+    for number, start in enumerate(range(0, max(len(typed), 1), EXCEL_MAX_ROWS), 1):
+        sheet = workbook.create_sheet(f"Sheet{number}")
+        sheet_names.append(sheet.title)
+        sheet.append(list(typed.columns))
+        chunk = typed.iloc[start:start + EXCEL_MAX_ROWS].astype(object).where(typed.iloc[start:start + EXCEL_MAX_ROWS].notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(path)
+    return sheet_names
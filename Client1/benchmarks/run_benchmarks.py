@@ -0,0 +1,278 @@
+# Benchmarks for the server.py hot paths on synthetic data.
+#
+#   python benchmarks/run_benchmarks.py --rows 10000,100000 --output results.json
+#   python benchmarks/run_benchmarks.py --rows 10000 --baseline results.json
+#
+# Every benchmark reports latency percentiles over --repeat timed runs and
+# the peak Python heap (tracemalloc) of one extra run; upload parsing happens
+# in worker processes, so upload_files only counts the server process.
+# With --baseline, a p50 or peak memory more than --tolerance above the
+# baseline (and, for p50, more than --min-delta-ms) is a regression and the
+# script exits with status 1. Baselines are whatever --output wrote on the
+# machine that compares against them; none are checked in.
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+from typing import Callable, Optional
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+import datagen
+
+# Configure the server before importing it: snapshots go to a throwaway
+# directory and nothing is precomputed behind the benchmarks' back
+_snapshot_dir = tempfile.TemporaryDirectory(prefix="bench-snapshots-")
+os.environ.setdefault("SNAPSHOT_DIR", _snapshot_dir.name)
+os.environ["PREFILL_RESULT_CACHE"] = "0"
+
+import pandas as pd
+import server
+from fastapi.testclient import TestClient
+from fake_sheets import FakeSheetsService
+from widget_planner import PlannedRequest
+
+
+FILTER_CONFIG = [
+    {"id": "year", "column": "Year"},
+    {"id": "sector", "column": "sector"},
+    {"id": "sym", "column": "sym", "dependsOn": ["sector"]},
+]
+SHEET_URL = "https://docs.google.com/spreadsheets/d/bench/edit"
+SHEETS = {"googlesheet1": "Prices", "googlesheet2": "SP500", "googlesheet3": "Stocks"}
+
+
+@contextlib.contextmanager
+def quiet():
+    # server.py prints ingest progress (and, with DEBUG_LOG=1, frames); keep that out of the timings' output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def percentiles(seconds: list[float]) -> dict[str, float]:
+    ms = np.array(seconds) * 1000
+    return {
+        "runs": len(ms),
+        "min_ms": float(ms.min()),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1, before_each: Optional[Callable[[], None]] = None) -> dict:
+    with quiet():
+        for _ in range(warmup):
+            if before_each:
+                before_each()
+            fn()
+        timings = []
+        for _ in range(repeat):
+            if before_each:
+                before_each()
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        # Separate run for memory: tracemalloc slows allocation-heavy code down
+        if before_each:
+            before_each()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {**percentiles(timings), "peak_memory_bytes": int(peak)}
+
+
+class Bench:
+    def __init__(self, rows: int, stock_rows: int, repeat: int, workdir: str):
+        self.rows = rows
+        self.stock_rows = stock_rows
+        self.repeat = repeat
+        self.workdir = workdir
+        self.client = TestClient(server.app)
+        self.frames = {
+            "googlesheet1": datagen.price_trend_frame(rows),
+            "googlesheet2": datagen.sp500_frame(stock_rows),
+            "googlesheet3": datagen.stocks_frame(stock_rows),
+        }
+        self.fake = FakeSheetsService(
+            {"bench": {SHEETS[name]: datagen.to_values(df) for name, df in self.frames.items()}},
+            grid_rows=max(rows, stock_rows) + 1000,
+        )
+        server.build_sheets_service = lambda token: self.fake
+        server.build_drive_service = lambda token: self.fake
+
+    def post_sheet(self, dataset_name: str, refresh_mode: str) -> None:
+        response = self.client.post("/process-google-sheet/", data={
+            "sheet_url": SHEET_URL, "auth_token": "bench", "sheet_name": SHEETS[dataset_name],
+            "sheet_index": int(dataset_name[-1]), "refresh_mode": refresh_mode,
+        }).json()
+        assert response["success"], response
+
+    def load(self) -> None:
+        with quiet():
+            for dataset_name in SHEETS:
+                self.post_sheet(dataset_name, "full")
+            response = self.client.post("/set-filter-config/", json={"filterConfig": json.dumps(FILTER_CONFIG)}).json()
+        assert response["success"], response
+
+    def upload_files(self) -> dict:
+        path = os.path.join(self.workdir, f"prices-{self.rows}.xlsx")
+        # Uploads read at most 5 sheets of at most EXCEL_MAX_ROWS rows
+        frame = self.frames["googlesheet1"].iloc[:5 * datagen.EXCEL_MAX_ROWS]
+        if not os.path.exists(path):
+            datagen.write_xlsx(frame, path)
+
+        def upload():
+            with open(path, "rb") as f:
+                response = self.client.post(
+                    "/upload-files/",
+                    files=[("files", (os.path.basename(path), f, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"))],
+                    data={"wait": "true"},
+                ).json()
+            assert response["success"], response
+        return measure(upload, self.repeat)
+
+    def process_google_sheet(self) -> dict:
+        return measure(lambda: self.post_sheet("googlesheet1", "full"), self.repeat)
+
+    def process_google_sheet_refresh(self) -> dict:
+        # Refresh of an unchanged sheet (its Drive revision didn't move)
+        return measure(lambda: self.post_sheet("googlesheet1", "auto"), self.repeat)
+
+    def planner_stage(self, stage: Callable[[PlannedRequest], object]) -> dict:
+        # One stage of a /get-data/ request on the price trend source, as the
+        # planner runs it: a fresh request each time (requests memoize their
+        # stages), with the cached views and filter indexes already built
+        with server.registry.read() as snapshot:
+            years = sorted(v for v in snapshot["googlesheet1"]["Year"].dropna().unique().tolist() if v)
+            filter_values = {"Year": years[len(years) // 3: len(years) // 3 + 3]}
+            new_request = lambda: PlannedRequest(server.dashboard_planner, server.catalog, snapshot, filter_values, {})
+            return measure(lambda: stage(new_request()), self.repeat)
+
+    def get_data(self, query: str, cached: bool, etag: bool = False) -> dict:
+        headers = {}
+        if etag:
+            with quiet():
+                headers["If-None-Match"] = self.client.get("/get-data/" + query).headers["etag"]
+
+        def request():
+            response = self.client.get("/get-data/" + query, headers=headers)
+            assert response.status_code == (304 if etag else 200), response.status_code
+        return measure(request, self.repeat, before_each=None if cached else server.result_cache.clear)
+
+    def get_data_detail(self, widget: str) -> dict:
+        # Second page of a reduced widget's full rows
+        with quiet():
+            cursor = self.client.get("/get-data/detail/", params={"widget": widget}).json()["next_cursor"]
+
+        def request():
+            response = self.client.get("/get-data/detail/", params={"widget": widget, "cursor": cursor}).json()
+            assert response["success"], response
+        return measure(request, self.repeat)
+
+    def run(self, only: Optional[set[str]]) -> dict[str, dict]:
+        self.load()
+        sector = datagen.SECTORS[0]
+        benchmarks = {
+            "upload_files": self.upload_files,
+            "process_google_sheet": self.process_google_sheet,
+            "process_google_sheet_refresh": self.process_google_sheet_refresh,
+            "planner_filtered": lambda: self.planner_stage(lambda request: request.filtered("price_trends_clean")),
+            "planner_filter_options": lambda: self.planner_stage(lambda request: request.options("price_trends_clean")),
+            "get_data_uncached": lambda: self.get_data("", cached=False),
+            "get_data_uncached_filtered": lambda: self.get_data(f"?sector={sector}", cached=False),
+            "get_data_cached": lambda: self.get_data("", cached=True),
+            "get_data_columnar_cached": lambda: self.get_data("?format=columnar", cached=True),
+            "get_data_not_modified": lambda: self.get_data("", cached=True, etag=True),
+            "get_data_detail_page": lambda: self.get_data_detail("price_trends.series"),
+        }
+        results = {}
+        for name, benchmark in benchmarks.items():
+            if only and name not in only:
+                continue
+            results[f"{name}@{self.rows}"] = benchmark()
+            print(format_row(f"{name}@{self.rows}", results[f"{name}@{self.rows}"]), flush=True)
+        return results
+
+
+def format_row(key: str, result: dict, baseline: Optional[dict] = None) -> str:
+    row = f"{key:<45} p50 {result['p50_ms']:>10.2f} ms  p95 {result['p95_ms']:>10.2f} ms  p99 {result['p99_ms']:>10.2f} ms  peak {result['peak_memory_bytes'] / 2**20:>9.1f} MB"
+    if baseline:
+        row += f"  (p50 {result['p50_ms'] / baseline['p50_ms'] - 1:+.0%}, peak {result['peak_memory_bytes'] / max(baseline['peak_memory_bytes'], 1) - 1:+.0%})"
+    return row
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], tolerance: float, min_delta_ms: float) -> list[str]:
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        print(format_row(key, result, base))
+        if result["p50_ms"] > base["p50_ms"] * (1 + tolerance) and result["p50_ms"] - base["p50_ms"] > min_delta_ms:
+            regressions.append(f"{key}: p50 {base['p50_ms']:.2f} -> {result['p50_ms']:.2f} ms")
+        if result["peak_memory_bytes"] > base["peak_memory_bytes"] * (1 + tolerance):
+            regressions.append(f"{key}: peak memory {base['peak_memory_bytes']} -> {result['peak_memory_bytes']} bytes")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark server.py hot paths on synthetic sheets")
+    parser.add_argument("--rows", default="10000,100000", help="comma-separated googlesheet1 row counts, e.g. 10000,1000000,10000000")
+    parser.add_argument("--stock-rows", type=int, default=None, help="rows of googlesheet2/3 (default: same as --rows)")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per benchmark")
+    parser.add_argument("--only", default="", help="comma-separated benchmark names to run")
+    parser.add_argument("--output", help="write results as JSON (usable as a later --baseline)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown / memory growth over the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="p50 slowdowns smaller than this are timer noise, not regressions")
+    args = parser.parse_args()
+
+    only = {name.strip() for name in args.only.split(",") if name.strip()} or None
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        for rows in [int(r) for r in args.rows.split(",")]:
+            results.update(Bench(rows, args.stock_rows or rows, args.repeat, workdir).run(only))
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import pandas as pd
+
+
+# Text columns with at most this fraction of distinct values become categoricals
+CATEGORY_MAX_UNIQUE_FRACTION = 0.5
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def compact_series(series: pd.Series) -> pd.Series:
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype):
+        return series
+
+    if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        # Raw cells: numbers only get a numeric dtype when every cell already is
+        # one, numeric-looking strings stay strings (filters compare strings)
+        inferred = pd.api.types.infer_dtype(series, skipna=True)
+        if inferred == "integer":
+            series = series.astype("Int64")
+        elif inferred in ("floating", "mixed-integer-float"):
+            series = series.astype("float64")
+        elif inferred == "string":
+            unique = series.nunique(dropna=True)
+            if unique <= CATEGORY_MAX_UNIQUE_FRACTION * len(series):
+                return series.astype("category")
+            return series
+        else:
+            return series
+
+    if pd.api.types.is_integer_dtype(series.dtype):
+        # Aggregations upcast to 64 bits again, so narrow storage can't overflow sums
+        return pd.to_numeric(series, downcast="integer")
+    # Floats stay 64-bit: float32 sums and means accumulate in float32 and drift
+    return series
+
+
+def compact_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    # Smallest lossless dtype per column: categoricals for repetitive text,
+    # narrow integers. Values and their order don't change.
+    if df.empty or not df.columns.is_unique:
+        return df
+    compacted = df.copy(deep=False)
+    for column in df.columns:
+        compacted[column] = compact_series(df[column])
+    return compacted
@@ -0,0 +1,84 @@
+import pandas as pd
+
+
+# Per-dataset cleaning rules, applied once when a dataset is ingested so that
+# /get-data/ only ever reads typed frames.
+#   lowercase_columns: lowercase every column name before anything else runs
+#   columns:           column name -> converter name (see CONVERTERS below)
+#   date_parts:        datetime column to derive string "Year"/"Quarter"/"Month" columns from
+#                      ("2020", "2020-Q1", "2020-03": quarters and months carry their
+#                      year, so grouping by them never merges different years)
+DATASET_SCHEMAS = {
+    "googlesheet1": {
+        "columns": {
+            "Gold Price": "number_with_commas",
+            "Housing Price": "number",
+            "Date": "datetime",
+        },
+        "date_parts": "Date",
+    },
+    "googlesheet2": {
+        "lowercase_columns": True,
+        "columns": {"market cap": "number"},
+    },
+    "googlesheet3": {
+        "lowercase_columns": True,
+        "columns": {"% stock weight": "percent"},
+    },
+}
+
+
+def to_number(series: pd.Series) -> pd.Series:
+    return pd.to_numeric(series, errors="coerce").fillna(0)
+
+def to_number_with_commas(series: pd.Series) -> pd.Series:
+    # "1,234.50" -> 1234.5
+    return to_number(series.astype(str).str.replace(',', ''))
+
+def to_percent(series: pd.Series) -> pd.Series:
+    # '3.45%' -> 0.0345
+    cleaned = series.astype(str).str.replace('%', '').str.strip()
+    return (pd.to_numeric(cleaned, errors="coerce") / 100).fillna(0)
+
+def to_datetime(series: pd.Series) -> pd.Series:
+    return pd.to_datetime(series, errors="coerce")
+
+CONVERTERS = {
+    "number": to_number,
+    "number_with_commas": to_number_with_commas,
+    "percent": to_percent,
+    "datetime": to_datetime,
+}
+
+
+def derive_date_parts(dates: pd.Series) -> dict[str, pd.Series]:
+    # Year as a string ("" for unparseable dates), "YYYY-Qn" and "YYYY-MM"; these
+    # sort chronologically as plain strings
+    years = dates.dt.year
+    valid = years.notna()
+    year = pd.Series("", index=dates.index, dtype=object)
+    year[valid] = years[valid].astype(int).astype(str)
+    quarter = pd.Series("", index=dates.index, dtype=object)
+    quarter[valid] = year[valid] + "-Q" + dates.dt.quarter[valid].astype(int).astype(str)
+    month = dates.dt.strftime('%Y-%m').fillna("")
+    return {"Year": year, "Quarter": quarter, "Month": month}
+
+
+def normalize_dataset(dataset_name: str, df: pd.DataFrame) -> pd.DataFrame:
+    schema = DATASET_SCHEMAS.get(dataset_name)
+    if not schema or df.empty:
+        return df
+
+    if schema.get("lowercase_columns"):
+        df = df.rename(columns=str.lower)
+
+    converted = {}
+    for column, converter in schema.get("columns", {}).items():
+        if column in df.columns:
+            converted[column] = CONVERTERS[converter](df[column])
+
+    date_column = schema.get("date_parts")
+    if date_column and date_column in converted:
+        converted.update(derive_date_parts(converted[date_column]))
+
+    return df.assign(**converted) if converted else df
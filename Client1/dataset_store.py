@@ -0,0 +1,157 @@
+import threading
+from collections.abc import MutableMapping
+from itertools import count
+from typing import Callable, Optional
+
+import pandas as pd
+
+from compaction import frame_bytes
+
+
+class DatasetStore(MutableMapping):
+    # Frames of the current dataset versions (registry.py decides which
+    # versions those are). Behaves like the plain dict it replaces, except
+    # that an entry can be registered with a loader instead of a frame (e.g. a
+    # snapshot on disk); the loader runs the first time the entry is read.
+    # With a memory budget set, the least recently read frames are swapped
+    # back to loaders (through `reloader`) whenever the loaded frames, plus the
+    # caches derived from them (`derived_bytes`), exceed it. An evicted frame
+    # takes its derived caches with it (`drop_derived`): a filtered copy of a
+    # dataset would otherwise keep most of its memory in use.
+
+    def __init__(self):
+        self._frames = {}  # dataset name -> DataFrame
+        self._loaders = {}  # dataset name -> callable returning the DataFrame, not loaded yet
+        self._sizes = {}  # dataset name -> (bytes, rows) when last loaded
+        self._last_used = {}  # dataset name -> tick of the last read
+        self._ticks = count()
+        self._lock = threading.Lock()  # One load per dataset, even with concurrent readers
+        self.budget_bytes = 0
+        self.reloader = None
+        self.derived_bytes = lambda: 0
+        self.drop_derived = lambda dataset_name: None
+        self.evictions = 0
+        self.reloads = 0
+
+    def set_budget(
+        self,
+        budget_bytes: int,
+        reloader: Callable[[str], Optional[Callable[[], pd.DataFrame]]],
+        derived_bytes: Optional[Callable[[], int]] = None,
+        drop_derived: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        # reloader(name) returns a loader for the stored frame, or None when
+        # the frame can't be reloaded (no up to date copy on disk) and must stay
+        self.budget_bytes = budget_bytes
+        self.reloader = reloader
+        if derived_bytes is not None:
+            self.derived_bytes = derived_bytes
+        if drop_derived is not None:
+            self.drop_derived = drop_derived
+
+    def register_lazy(self, dataset_name: str, loader: Callable[[], pd.DataFrame]) -> None:
+        with self._lock:
+            self._frames.pop(dataset_name, None)
+            self._loaders[dataset_name] = loader
+
+    def is_loaded(self, dataset_name: str) -> bool:
+        return dataset_name in self._frames
+
+    def loaded_bytes(self) -> int:
+        return sum(self._sizes[name][0] for name in list(self._frames) if name in self._sizes)
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        # Called with the lock held
+        if not self.budget_bytes or self.reloader is None:
+            return
+        used = self.loaded_bytes() + self.derived_bytes()
+        for name in sorted(self._frames, key=lambda n: self._last_used.get(n, -1)):
+            if used <= self.budget_bytes:
+                break
+            if name == keep:
+                continue
+            loader = self.reloader(name)
+            if loader is None:
+                continue
+            del self._frames[name]
+            self._loaders[name] = loader
+            self.drop_derived(name)
+            freed = used - self.loaded_bytes() - self.derived_bytes()
+            used -= freed
+            self.evictions += 1
+            print(f"Evicted {name} ({freed} bytes with its derived caches) to stay under the dataset memory budget")
+
+    def trim(self) -> None:
+        # Enforce the budget after derived caches grew (they are built by queries, not here)
+        with self._lock:
+            self._evict()
+
+    def __getitem__(self, dataset_name: str) -> pd.DataFrame:
+        frame = self._frames.get(dataset_name)
+        if frame is not None:
+            self._last_used[dataset_name] = next(self._ticks)
+            return frame
+        with self._lock:
+            frame = self._frames.get(dataset_name)
+            if frame is not None:
+                return frame
+            loader = self._loaders.get(dataset_name)
+            if loader is None:
+                raise KeyError(dataset_name)
+            frame = loader()
+            self._frames[dataset_name] = frame
+            self._sizes[dataset_name] = (frame_bytes(frame), len(frame))
+            del self._loaders[dataset_name]
+            self._last_used[dataset_name] = next(self._ticks)
+            self.reloads += 1
+            self._evict(keep=dataset_name)
+            return frame
+
+    def __setitem__(self, dataset_name: str, df: pd.DataFrame) -> None:
+        self.put(dataset_name, df)
+
+    def put(self, dataset_name: str, df: pd.DataFrame, size: Optional[tuple[int, int]] = None) -> None:
+        # `size` ((bytes, rows)) may be measured beforehand, outside any lock
+        size = size or (frame_bytes(df), len(df))
+        with self._lock:
+            self._frames[dataset_name] = df
+            self._loaders.pop(dataset_name, None)
+            self._sizes[dataset_name] = size
+            self._last_used[dataset_name] = next(self._ticks)
+            self._evict(keep=dataset_name)
+
+    def __delitem__(self, dataset_name: str) -> None:
+        with self._lock:
+            if dataset_name not in self._frames and dataset_name not in self._loaders:
+                raise KeyError(dataset_name)
+            self._frames.pop(dataset_name, None)
+            self._loaders.pop(dataset_name, None)
+            self._sizes.pop(dataset_name, None)
+            self._last_used.pop(dataset_name, None)
+
+    def __contains__(self, dataset_name) -> bool:
+        return dataset_name in self._frames or dataset_name in self._loaders
+
+    def __iter__(self):
+        return iter(list(self._frames) + [name for name in list(self._loaders) if name not in self._frames])
+
+    def __len__(self) -> int:
+        return len(self._frames) + len(self._loaders)
+
+    def stats(self) -> dict:
+        datasets = {}
+        for name in list(self):
+            size = self._sizes.get(name)
+            datasets[name] = {
+                "loaded": name in self._frames,
+                "bytes": size[0] if size else None,  # Last known size for datasets on disk
+                "rows": size[1] if size else None,
+            }
+        return {
+            "budget_bytes": self.budget_bytes,
+            "loaded_bytes": self.loaded_bytes(),
+            "derived_bytes": self.derived_bytes(),
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+            "datasets": datasets,
+        }
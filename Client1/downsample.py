@@ -0,0 +1,93 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Shape-preserving reduction of a time series to a fixed number of points,
+# for charts that can't show more points than they have pixels. Both
+# methods return positions into x / y (sorted by x), so every returned point
+# is a real sample and the first and last samples are always kept.
+METHODS = ("lttb", "minmax")
+
+
+def as_numbers(values: pd.Series) -> np.ndarray:
+    # Dates as nanoseconds, everything else as float
+    if pd.api.types.is_datetime64_any_dtype(values):
+        numbers = values.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+        numbers[values.isna().to_numpy()] = np.nan  # NaT is the lowest int64, not NaN
+        return numbers
+    return pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: the samples between the first and the
+    # last are split into points - 2 equal buckets, and from each bucket the
+    # sample forming the largest triangle with the sample kept from the
+    # previous bucket and the mean of the next bucket is kept
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1], dtype=np.int64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    kept = np.empty(points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        px, py = x[previous], y[previous]
+        # Twice the triangle areas; the constant factor doesn't change the argmax
+        areas = np.abs((px - next_x) * (y[start:end] - py) - (px - x[start:end]) * (next_y - py))
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def minmax(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    # The lowest and the highest sample of each of points / 2 equal buckets
+    # (in x order): spikes survive any reduction, at the cost of a jagged line
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    buckets = max(points // 2, 1)
+    starts = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+    # Vectorized over all buckets: each bucket's extreme with reduceat, then
+    # the first position in the bucket that holds it
+    bucket_of = np.repeat(np.arange(buckets), np.diff(np.append(starts, n)))
+    kept = [np.array([0, n - 1])]
+    for extremes in (np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)):
+        hits = np.flatnonzero(y == extremes[bucket_of])
+        first = np.unique(bucket_of[hits], return_index=True)[1]
+        kept.append(hits[first])
+    return np.unique(np.concatenate(kept))
+
+
+def downsample(df: pd.DataFrame, x: str, y: str, points: int, method: str = "lttb") -> tuple[pd.DataFrame, int]:
+    # Rows of df (sorted by x) with a value for x and y, reduced to about
+    # `points` rows; also returns how many rows there were to reduce
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}', expected one of: {', '.join(METHODS)}")
+    xs, ys = as_numbers(df[x]), as_numbers(df[y])
+    valid = ~(np.isnan(xs) | np.isnan(ys))
+    if not valid.all():
+        df, xs, ys = df[valid], xs[valid], ys[valid]
+    kept = (lttb if method == "lttb" else minmax)(xs, ys, points)
+    return df.take(kept), len(df)
+
+
+def top_with_other(df: pd.DataFrame, column: str, n: int, other: Optional[dict] = None) -> pd.DataFrame:
+    # The n rows with the largest `column`, plus one row summing the rest;
+    # `other` fills the remaining columns of that row (e.g. {"sym": "Other"})
+    # (selection, not a sort of every row: the rest only contributes its sum)
+    top = df.nlargest(n, column)
+    if len(df) <= n:
+        return top
+    row = {c: None for c in df.columns}
+    row.update(other or {})
+    row[column] = df[column].sum() - top[column].sum()
+    return pd.concat([top, pd.DataFrame([row], columns=df.columns)], ignore_index=True)
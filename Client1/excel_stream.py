@@ -0,0 +1,148 @@
+import sys
+from array import array
+from datetime import date, datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+
+NUMERIC_CELL_BYTES = 8
+POINTER_BYTES = 8
+
+
+class ColumnBuffer:
+    # Cells of one column. Stays a packed array of doubles while every cell is
+    # numeric or empty and falls back to a plain list on the first other value.
+
+    def __init__(self, leading_empty: int = 0):
+        self.numbers = array("d", [float("nan")] * leading_empty)
+        self.values = None
+        self.integral = True
+
+    def __len__(self):
+        return len(self.values) if self.values is not None else len(self.numbers)
+
+    def append(self, value) -> int:
+        # Returns the approximate number of bytes the cell added
+        if self.values is None:
+            if value is None:
+                self.numbers.append(float("nan"))
+                return NUMERIC_CELL_BYTES
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if isinstance(value, float) and not value.is_integer():
+                    self.integral = False
+                self.numbers.append(value)
+                return NUMERIC_CELL_BYTES
+            self.values = [None if np.isnan(n) else (int(n) if self.integral else n) for n in self.numbers]
+            self.numbers = None
+        self.values.append(value)
+        return POINTER_BYTES + (sys.getsizeof(value) if value is not None else 0)
+
+    def to_series(self) -> pd.Series:
+        if self.values is None:
+            numbers = np.frombuffer(self.numbers, dtype=np.float64)
+            if self.integral and len(numbers) and not np.isnan(numbers).all():
+                return pd.Series(pd.array(numbers, dtype="Float64")).astype("Int64")
+            return pd.Series(pd.array(numbers, dtype="Float64"))
+        # Dates and datetimes become datetime64; time-of-day cells (datetime.time)
+        # have no datetime64 form and stay objects, as pd.read_excel keeps them
+        if all(isinstance(v, (datetime, date)) or v is None for v in self.values) and any(v is not None for v in self.values):
+            return pd.Series(pd.to_datetime(self.values, errors="coerce"))
+        return pd.Series(self.values, dtype=object)
+
+
+def _header_names(header_row: tuple, width: int = 0) -> list[str]:
+    # Same naming as pandas: "Unnamed: i" for blank headers (and for data
+    # columns past the end of the header, up to `width`), ".1" suffixes for repeats
+    names = []
+    seen = {}
+    for i in range(max(len(header_row), width)):
+        value = header_row[i] if i < len(header_row) else None
+        name = f"Unnamed: {i}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def read_excel_streaming(path: str, sheet_names: Optional[list[str]] = None, max_sheets: int = 5, memory_cap_bytes: Optional[int] = None) -> tuple[pd.DataFrame, list[str]]:
+    # Streams rows of each sheet (openpyxl read-only mode) straight into typed
+    # column buffers shared across sheets, so the result is assembled once with
+    # no per-sheet DataFrames to concatenate. Columns missing from a sheet are
+    # left empty for its rows, like pd.concat. Leading empty rows are skipped
+    # (the header is the first non-empty row) and trailing ones dropped.
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = sheet_names or workbook.sheetnames[:max_sheets]
+        columns = {}  # column name -> ColumnBuffer
+        num_rows = 0
+        used_bytes = 0
+        for sheet in sheets:
+            worksheet = workbook[sheet]
+            worksheet.reset_dimensions()  # Don't trust the stored sheet dimensions
+            rows = worksheet.iter_rows(values_only=True)
+            header = next((row for row in rows if any(value is not None for value in row)), None)
+            if header is None:  # Nothing but empty rows
+                continue
+            names, buffers, others = [], [], []
+
+            def use_columns(width: int) -> None:
+                # Buffers for the first `width` columns of this sheet; rows wider
+                # than the header get "Unnamed: i" columns, as in pd.read_excel
+                names[:] = _header_names(header, width)
+                for name in names[len(buffers):]:
+                    if name not in columns:
+                        columns[name] = ColumnBuffer(leading_empty=num_rows)
+                    buffers.append(columns[name])
+                others[:] = [buffer for name, buffer in columns.items() if name not in names]
+
+            use_columns(len(header))
+
+            blank_rows = 0  # Held back until a non-empty row shows they aren't trailing
+            for row in rows:
+                if all(value is None for value in row):
+                    blank_rows += 1
+                    continue
+                for _ in range(blank_rows):
+                    for buffer in buffers + others:
+                        used_bytes += buffer.append(None)
+                num_rows += blank_rows
+                blank_rows = 0
+                if len(row) > len(buffers) and any(value is not None for value in row[len(buffers):]):
+                    use_columns(len(row))
+                for i, buffer in enumerate(buffers):
+                    used_bytes += buffer.append(row[i] if i < len(row) else None)
+                for buffer in others:
+                    used_bytes += buffer.append(None)
+                num_rows += 1
+                if memory_cap_bytes and used_bytes > memory_cap_bytes:
+                    raise ValueError(f"Workbook exceeds the ingest memory cap of {memory_cap_bytes / (1024 * 1024):g} MB")
+
+        if not columns:
+            raise ValueError(f"No data found in sheet(s): {', '.join(map(str, sheets))}")
+        return pd.DataFrame({name: buffer.to_series() for name, buffer in columns.items()}), list(sheets)
+    finally:
+        workbook.close()
+
+
+def list_sheets(path: str) -> list[str]:
+    workbook = load_workbook(path, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def read_excel_file(path: str, sheet_names: list[str], mode: str = "streaming", memory_cap_bytes: Optional[int] = None) -> pd.DataFrame:
+    # The given sheets of a workbook as one frame; module-level so upload jobs
+    # can run it in worker processes. Streaming fills one set of column
+    # buffers for all sheets, so the memory cap covers the whole file.
+    if mode == "streaming":
+        return read_excel_streaming(path, sheet_names, memory_cap_bytes=memory_cap_bytes)[0]
+    frames = pd.read_excel(path, sheet_name=sheet_names, engine="openpyxl", dtype_backend='numpy_nullable')
+    return pd.concat([frames[sheet] for sheet in sheet_names], ignore_index=True)
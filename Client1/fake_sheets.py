@@ -0,0 +1,179 @@
+import re
+import time
+import threading
+from typing import Optional
+
+
+# In-memory stand-in for the parts of the Sheets v4 service used by
+# SheetsFetcher (spreadsheets().get, values().get, values().batchGet), and of
+# the Drive v3 service (files().get), so the ingest path can be exercised and
+# benchmarked without Google credentials.
+
+class FakeResponse:
+    def __init__(self, status: int):
+        self.status = status
+
+class FakeHttpError(Exception):
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(f"HTTP {status}: {message}")
+        self.resp = FakeResponse(status)
+
+
+class FakeRequest:
+    def __init__(self, service: "FakeSheetsService", handler):
+        self.service = service
+        self.handler = handler
+
+    def execute(self):
+        self.service._before_request()
+        return self.handler()
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == ""
+
+def _trim_row(row: list) -> list:
+    end = len(row)
+    while end and _is_empty(row[end - 1]):
+        end -= 1
+    return list(row[:end])
+
+def _column_number(letters: str) -> int:
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+RANGE_PATTERN = re.compile(r"^(?:'((?:[^']|'')*)'|([^!]+))(?:!([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?)?$")
+
+
+class FakeSheetsService:
+    def __init__(self, spreadsheets: dict[str, dict[str, list[list]]], grid_rows: int = 1000, latency_seconds: float = 0.0, fail_first: int = 0, fail_status: int = 429):
+        # spreadsheets: spreadsheet id -> sheet title -> rows (header first)
+        self.spreadsheets_data = spreadsheets
+        self.grid_rows = grid_rows
+        self.latency_seconds = latency_seconds
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests = 0
+        self.cells_returned = 0
+        self._lock = threading.Lock()
+
+    def _before_request(self):
+        with self._lock:
+            self.requests += 1
+            failing = self.requests <= self.fail_first
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if failing:
+            raise FakeHttpError(self.fail_status, "injected failure")
+
+    def _sheet(self, spreadsheet_id: str, title: str) -> list[list]:
+        sheets = self.spreadsheets_data.get(spreadsheet_id)
+        if sheets is None:
+            raise FakeHttpError(404, f"Spreadsheet {spreadsheet_id} not found")
+        if title not in sheets:
+            raise FakeHttpError(400, f"Unable to parse range: {title}")
+        return sheets[title]
+
+    def _row_count(self, rows: list[list]) -> int:
+        return max(len(rows), self.grid_rows)
+
+    def _read_range(self, spreadsheet_id: str, range_str: str, major_dimension: str = "ROWS") -> dict:
+        match = RANGE_PATTERN.match(range_str)
+        if not match:
+            raise FakeHttpError(400, f"Unable to parse range: {range_str}")
+        quoted, plain, start_col, start_row, end_col, end_row = match.groups()
+        title = quoted.replace("''", "'") if quoted is not None else plain
+        rows = self._sheet(spreadsheet_id, title)
+        row_count = self._row_count(rows)
+
+        first_row = int(start_row) if start_row else 1
+        last_row = int(end_row) if end_row else (first_row if start_row and end_col is None else row_count)
+        first_col = _column_number(start_col) if start_col else 1
+        last_col = _column_number(end_col) if end_col else (first_col if start_col and end_col is None else None)
+        if first_row > row_count or last_row > row_count:
+            raise FakeHttpError(400, f"Range ({range_str}) exceeds grid limits")
+
+        values = []
+        for row in rows[first_row - 1:last_row]:
+            cells = row[first_col - 1:last_col] if last_col is not None else row[first_col - 1:]
+            values.append(_trim_row(["" if v is None else str(v) for v in cells]))
+        while values and not values[-1]:
+            values.pop()
+        if major_dimension == "COLUMNS":
+            width = max((len(v) for v in values), default=0)
+            values = [_trim_row([v[c] if c < len(v) else "" for v in values]) for c in range(width)]
+
+        with self._lock:
+            self.cells_returned += sum(len(v) for v in values)
+        result = {"range": range_str, "majorDimension": major_dimension}
+        if values:
+            result["values"] = values
+        return result
+
+    def spreadsheets(self):
+        return FakeSpreadsheets(self)
+
+    def files(self):
+        return FakeFiles(self)
+
+
+class FakeFiles:
+    def __init__(self, service: FakeSheetsService):
+        self.service = service
+
+    def get(self, fileId: str, fields: Optional[str] = None, **kwargs):
+        def handler():
+            sheets = self.service.spreadsheets_data.get(fileId)
+            if sheets is None:
+                raise FakeHttpError(404, f"File {fileId} not found")
+            # Tests edit the rows in place, so the version is derived from the
+            # contents: it changes exactly when Drive's would
+            return {"version": str(hash(repr(sheets)) & 0xFFFFFFFFFFFF)}
+        return FakeRequest(self.service, handler)
+
+
+class FakeSpreadsheets:
+    def __init__(self, service: FakeSheetsService):
+        self.service = service
+
+    def get(self, spreadsheetId: str, ranges: Optional[list[str]] = None, fields: Optional[str] = None, **kwargs):
+        def handler():
+            sheets = self.service.spreadsheets_data.get(spreadsheetId)
+            if sheets is None:
+                raise FakeHttpError(404, f"Spreadsheet {spreadsheetId} not found")
+            titles = list(sheets)
+            if ranges:
+                titles = []
+                for range_str in ranges:
+                    quoted, plain = RANGE_PATTERN.match(range_str).groups()[:2]
+                    titles.append(quoted.replace("''", "'") if quoted is not None else plain)
+            return {"sheets": [
+                {"properties": {
+                    "title": title,
+                    "gridProperties": {
+                        "rowCount": self.service._row_count(self.service._sheet(spreadsheetId, title)),
+                        "columnCount": max((len(row) for row in self.service._sheet(spreadsheetId, title)), default=26),
+                    },
+                }}
+                for title in titles
+            ]}
+        return FakeRequest(self.service, handler)
+
+    def values(self):
+        return FakeValues(self.service)
+
+
+class FakeValues:
+    def __init__(self, service: FakeSheetsService):
+        self.service = service
+
+    def get(self, spreadsheetId: str, range: str, majorDimension: str = "ROWS", **kwargs):
+        return FakeRequest(self.service, lambda: self.service._read_range(spreadsheetId, range, majorDimension))
+
+    def batchGet(self, spreadsheetId: str, ranges: list[str], majorDimension: str = "ROWS", **kwargs):
+        return FakeRequest(self.service, lambda: {
+            "spreadsheetId": spreadsheetId,
+            "valueRanges": [self.service._read_range(spreadsheetId, r, majorDimension) for r in ranges],
+        })
@@ -0,0 +1,145 @@
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnIndex:
+    # Dictionary-encoded column: every distinct value gets a code in sorted
+    # value order, and the row ids holding each code are stored as one sorted
+    # slice of `row_ids`, so looking up a value costs the size of its rows.
+
+    def __init__(self, series: pd.Series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        uniques = uniques.tolist()
+        try:
+            order = sorted(range(len(uniques)), key=lambda i: uniques[i])
+        except TypeError:  # Mixed types, e.g. numbers and strings in one column
+            order = sorted(range(len(uniques)), key=lambda i: str(uniques[i]))
+        rank = np.empty(len(uniques), dtype=np.int64)
+        rank[order] = np.arange(len(uniques))
+
+        # Missing values keep the -1 code and are never selected or offered
+        self.codes = np.where(codes >= 0, rank[codes] if len(uniques) else codes, -1)
+        self.values = [uniques[i] for i in order]
+        self.lookup = {value: code for code, value in enumerate(self.values)}
+        self.row_ids = np.argsort(self.codes, kind="stable")
+        self.bounds = np.searchsorted(self.codes[self.row_ids], np.arange(len(self.values) + 1))
+
+    def rows_for(self, values: list) -> np.ndarray:
+        # A value selected twice still selects its rows once, so the slices are
+        # disjoint and the result holds every row id at most once
+        slices = []
+        for value in dict.fromkeys(values):
+            code = self.lookup.get(value)
+            if code is not None:
+                slices.append(self.row_ids[self.bounds[code]:self.bounds[code + 1]])
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        if len(slices) == 1:
+            return slices[0]
+        return np.sort(np.concatenate(slices))
+
+    def options(self, rows: Optional[np.ndarray] = None) -> list:
+        if rows is None:
+            return list(self.values)
+        present = np.unique(self.codes[rows])
+        return [self.values[code] for code in present if code >= 0]
+
+
+def intersect_rows(selections: list[np.ndarray]) -> Optional[np.ndarray]:
+    # AND of several sorted row id arrays (each without repeats, see
+    # ColumnIndex.rows_for), smallest first
+    if not selections:
+        return None
+    selections = sorted(selections, key=len)
+    rows = selections[0]
+    for selection in selections[1:]:
+        if len(rows) == 0:
+            break
+        rows = np.intersect1d(rows, selection, assume_unique=True)
+    return rows
+
+
+class FilterPlan:
+    # FILTER_CONFIG compiled once per /set-filter-config/: depends_on ids are
+    # resolved to parent columns and the filters are ordered so that every
+    # parent comes before its children.
+
+    def __init__(self, filter_config: list[dict[str, Any]]):
+        columns_by_id = {config["id"]: config["column"] for config in filter_config if "id" in config}
+        children = {i: [] for i in range(len(filter_config))}
+        index_by_id = {config["id"]: i for i, config in enumerate(filter_config) if "id" in config}
+        pending_parents = {}
+        for i, config in enumerate(filter_config):
+            depends_on = config.get("depends_on") or []
+            for dep_id in depends_on:
+                if dep_id not in columns_by_id:
+                    raise ValueError(f"Filter '{config.get('id')}' depends on unknown filter '{dep_id}'")
+                children[index_by_id[dep_id]].append(i)
+            pending_parents[i] = len(depends_on)
+
+        order = []
+        ready = [i for i in range(len(filter_config)) if pending_parents[i] == 0]
+        while ready:
+            i = ready.pop(0)
+            order.append(i)
+            for child in children[i]:
+                pending_parents[child] -= 1
+                if pending_parents[child] == 0:
+                    ready.append(child)
+        if len(order) != len(filter_config):
+            raise ValueError("Filter config has a depends_on cycle")
+
+        # (column, parent columns) in topological order
+        self.filters = [
+            (filter_config[i]["column"], tuple(columns_by_id[dep_id] for dep_id in filter_config[i].get("depends_on") or []))
+            for i in order
+        ]
+        self.columns = list(dict.fromkeys(config["column"] for config in filter_config))
+
+
+class DatasetIndex:
+    # Column indexes for every filter column present in one frame
+
+    def __init__(self, df: pd.DataFrame, plan: FilterPlan):
+        self.num_rows = len(df)
+        self.columns = {column: ColumnIndex(df[column]) for column in plan.columns if column in df.columns}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(index.codes.nbytes + index.row_ids.nbytes + index.bounds.nbytes for index in self.columns.values())
+
+    def selection(self, column: str, filter_values: dict[str, Any]) -> Optional[np.ndarray]:
+        # Rows matching the selected values of one column, None if it isn't filtered
+        values = filter_values.get(column)
+        if not values or values == "All" or column not in self.columns:
+            return None
+        if isinstance(values, list):  # Checkbox multi-selection with OR logic
+            return self.columns[column].rows_for(values)
+        return self.columns[column].rows_for([str(values)])
+
+    def filter_rows(self, filter_values: dict[str, Any], plan: FilterPlan) -> Optional[np.ndarray]:
+        selections = []
+        for column in plan.columns:
+            rows = self.selection(column, filter_values)
+            if rows is not None:
+                selections.append(rows)
+        return intersect_rows(selections)
+
+    def filter_options(self, filter_values: dict[str, Any], plan: FilterPlan) -> dict[str, list]:
+        # One pass over the plan: each parent selection is looked up once and
+        # filters sharing the same parents share the same intersected rows
+        selections = {}
+        parent_rows = {}
+        filter_options = {}
+        for column, parents in plan.filters:
+            if column not in self.columns:
+                continue
+            if parents not in parent_rows:
+                for parent in parents:
+                    if parent not in selections:
+                        selections[parent] = self.selection(parent, filter_values)
+                parent_rows[parents] = intersect_rows([selections[p] for p in parents if selections[p] is not None])
+            filter_options[f"{column.lower()}_options"] = self.columns[column].options(parent_rows[parents])
+        return filter_options
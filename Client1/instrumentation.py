@@ -0,0 +1,301 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def frame_size(df: pd.DataFrame) -> int:
+    # Shallow size: exact for numeric and categorical columns, pointers only for
+    # object columns, and cheap enough to take on every stage
+    return int(df.memory_usage(index=False, deep=False).sum())
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # Per bucket, not cumulative
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: dict) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {self.count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(self.sum)}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+class StageTimer:
+    # Yielded by Metrics.stage; set rows / bytes once the stage knows them
+    def __init__(self, rows: Optional[int] = None, nbytes: Optional[int] = None):
+        self.rows = rows
+        self.bytes = nbytes
+
+
+class Metrics:
+    # Durations, rows and bytes per processing stage (ingest, parse, clean,
+    # filter, filter_options, merge, groupby, downsample, serialize) and latency per HTTP
+    # route, rendered in the Prometheus text format. Stages run on worker
+    # threads and processes' callbacks, so every update takes the lock.
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages = {}  # stage -> Histogram
+        self._stage_rows = Counter()
+        self._stage_bytes = Counter()
+        self._stage_errors = Counter()
+        self._requests = {}  # (method, route) -> Histogram
+        self._responses = Counter()  # (method, route, status) -> count
+
+    @contextmanager
+    def stage(self, name: str, rows: Optional[int] = None, nbytes: Optional[int] = None) -> Iterator[StageTimer]:
+        timer = StageTimer(rows, nbytes)
+        start = time.perf_counter()
+        try:
+            yield timer
+        except BaseException:
+            with self._lock:
+                self._stage_errors[name] += 1
+            raise
+        finally:
+            self.observe_stage(name, time.perf_counter() - start, timer.rows, timer.bytes)
+
+    def observe_stage(self, name: str, seconds: float, rows: Optional[int] = None, nbytes: Optional[int] = None) -> None:
+        with self._lock:
+            if name not in self._stages:
+                self._stages[name] = Histogram(self.buckets)
+            self._stages[name].observe(seconds)
+            if rows is not None:
+                self._stage_rows[name] += int(rows)
+            if nbytes is not None:
+                self._stage_bytes[name] += int(nbytes)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        with self._lock:
+            key = (method, route)
+            if key not in self._requests:
+                self._requests[key] = Histogram(self.buckets)
+            self._requests[key].observe(seconds)
+            self._responses[(method, route, status)] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "count": histogram.count,
+                    "seconds": histogram.sum,
+                    "rows": self._stage_rows[name],
+                    "bytes": self._stage_bytes[name],
+                    "errors": self._stage_errors[name],
+                }
+                for name, histogram in self._stages.items()
+            }
+
+    def render(self, extra: Optional[list[tuple[str, str, str, list[tuple[dict, float]]]]] = None) -> str:
+        # `extra`: (name, type, help, [(labels, value)]) for gauges and counters
+        # owned elsewhere (caches, executor, datasets)
+        lines = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("dashboard_stage_duration_seconds", "histogram", "Time spent in each processing stage")
+            for name in sorted(self._stages):
+                lines.extend(self._stages[name].samples("dashboard_stage_duration_seconds", {"stage": name}))
+            family("dashboard_stage_rows_total", "counter", "Rows produced by each processing stage")
+            for name in sorted(self._stage_rows):
+                lines.append(f"dashboard_stage_rows_total{_labels({'stage': name})} {self._stage_rows[name]}")
+            family("dashboard_stage_bytes_total", "counter", "Bytes produced by each processing stage")
+            for name in sorted(self._stage_bytes):
+                lines.append(f"dashboard_stage_bytes_total{_labels({'stage': name})} {self._stage_bytes[name]}")
+            family("dashboard_stage_errors_total", "counter", "Processing stages that raised")
+            for name in sorted(self._stage_errors):
+                lines.append(f"dashboard_stage_errors_total{_labels({'stage': name})} {self._stage_errors[name]}")
+            family("dashboard_http_request_duration_seconds", "histogram", "HTTP request latency per route")
+            for (method, route) in sorted(self._requests):
+                lines.extend(self._requests[(method, route)].samples(
+                    "dashboard_http_request_duration_seconds", {"method": method, "route": route}
+                ))
+            family("dashboard_http_responses_total", "counter", "HTTP responses per route and status")
+            for (method, route, status) in sorted(self._responses):
+                labels = {"method": method, "route": route, "status": status}
+                lines.append(f"dashboard_http_responses_total{_labels(labels)} {self._responses[(method, route, status)]}")
+
+        for name, kind, help_text, samples in extra or []:
+            family(name, kind, help_text)
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    # ASGI middleware timing every HTTP request by route template ("/upload-jobs/{job_id}",
+    # not the raw path); streamed responses are timed until their last byte
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.metrics.observe_request(scope["method"], route, status[0], time.perf_counter() - start)
+
+
+def _stack(frame) -> str:
+    # Collapsed stack, root first ("file:function:line;..."), as flame graph tools read it
+    parts = []
+    while frame is not None and len(parts) < 64:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class SlowRequestProfiler:
+    # Sampling profiler for slow requests: while a watched block runs, a
+    # background thread records the watched thread's stack every
+    # `interval_seconds`. Blocks that took longer than `threshold_seconds`
+    # keep their most frequent stacks; the rest are thrown away. Disabled
+    # (no thread, no sampling) when the threshold is 0.
+
+    def __init__(self, threshold_seconds: float, interval_seconds: float = 0.005, keep: int = 20, top: int = 15):
+        self.threshold_seconds = threshold_seconds
+        self.interval_seconds = interval_seconds
+        self.top = top
+        self.slow_requests = 0
+        self._profiles = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_seconds > 0
+
+    @contextmanager
+    def watch(self, label: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        thread_id = threading.get_ident()
+        samples = Counter()
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.interval_seconds):
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    samples[_stack(frame)] += 1
+
+        sampler = threading.Thread(target=sample, name="slow-request-profiler", daemon=True)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            seconds = time.perf_counter() - start
+            if seconds >= self.threshold_seconds:
+                self._record(label, seconds, samples)
+
+    def _record(self, label: str, seconds: float, samples: Counter) -> None:
+        total = sum(samples.values())
+        leaves = Counter()
+        for stack, hits in samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += hits
+        profile = {
+            "label": label,
+            "seconds": round(seconds, 4),
+            "at": time.time(),
+            "samples": total,
+            "interval_seconds": self.interval_seconds,
+            "top_functions": [{"function": leaf, "samples": hits} for leaf, hits in leaves.most_common(self.top)],
+            "stacks": [{"stack": stack, "samples": hits} for stack, hits in samples.most_common(self.top)],
+        }
+        with self._lock:
+            self.slow_requests += 1
+            self._profiles.append(profile)
+        hottest = ", ".join(f"{leaf} ({hits}/{total})" for leaf, hits in leaves.most_common(3))
+        print(f"Slow request {label} took {seconds:.3f}s; hottest: {hottest or 'no samples'}")
+
+    def profiles(self) -> list[dict]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+
+class DebugLog:
+    # Opt-in debug output, at most one message per key every
+    # `interval_seconds`. Messages are callables so frames are only formatted
+    # when something is actually printed.
+
+    def __init__(self, enabled: bool, interval_seconds: float = 10.0):
+        self.enabled = enabled
+        self.interval_seconds = interval_seconds
+        self._last = {}  # key -> time of the last printed message
+        self._suppressed = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, key: str, message: Callable[[], str]) -> None:
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval_seconds:
+                self._suppressed[key] += 1
+                return
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        note = f" ({suppressed} suppressed)" if suppressed else ""
+        print(f"[debug] {key}{note}: {message()}")
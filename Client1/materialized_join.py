@@ -0,0 +1,103 @@
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from compaction import frame_bytes
+
+def hash_keys(df: pd.DataFrame, keys: list[str]) -> np.ndarray:
+    return pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+
+def key_signatures(df: pd.DataFrame, key_hashes: np.ndarray) -> pd.DataFrame:
+    # Row count and wrapping sum of row hashes per join key; a key whose rows
+    # changed in any way gets a different signature
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return pd.DataFrame({"key": key_hashes, "row": row_hashes}).groupby("key")["row"].agg(["count", "sum"])
+
+def changed_keys(old: pd.DataFrame, new: pd.DataFrame) -> np.ndarray:
+    all_keys = old.index.union(new.index)
+    old = old.reindex(all_keys, fill_value=0)
+    new = new.reindex(all_keys, fill_value=0)
+    differs = (old["count"].to_numpy() != new["count"].to_numpy()) | (old["sum"].to_numpy() != new["sum"].to_numpy())
+    return all_keys.to_numpy()[differs]
+
+
+class MaterializedJoin:
+    # Inner join of two datasets stored as a view. It is rebuilt only when an
+    # input changes version, and when only a few join keys changed the stored
+    # rows for those keys are replaced instead of re-running the whole merge.
+
+    def __init__(self, on: list[str], suffixes: tuple[str, str], rename: Optional[dict[str, str]] = None, max_incremental_fraction: float = 0.2):
+        self.on = on
+        self.suffixes = suffixes
+        self.rename = rename or {}
+        self.max_incremental_fraction = max_incremental_fraction
+        self.versions = None
+        self.frame = None
+        self.nbytes = 0  # Of self.frame
+        self.rebuilds = 0
+        self.incremental_updates = 0
+        self._columns = None
+        self._left_signatures = None
+        self._right_signatures = None
+        self._frame_keys = None  # join key hash of every row in self.frame
+        self._lock = threading.Lock()  # Queries call update() from several worker threads
+
+    def _merge(self, left: pd.DataFrame, right: pd.DataFrame) -> pd.DataFrame:
+        joined = pd.merge(left, right, on=self.on, how="inner", suffixes=self.suffixes)
+        return joined.rename(columns=self.rename)
+
+    def clear(self) -> None:
+        # Forget the stored rows (e.g. when an input is evicted); the next update rebuilds them
+        with self._lock:
+            self.versions = None
+            self.frame = None
+            self.nbytes = 0
+            self._columns = None
+            self._left_signatures = None
+            self._right_signatures = None
+            self._frame_keys = None
+
+    def update(self, left: pd.DataFrame, right: pd.DataFrame, versions: tuple) -> pd.DataFrame:
+        with self._lock:
+            return self._update(left, right, versions)
+
+    def _update(self, left: pd.DataFrame, right: pd.DataFrame, versions: tuple) -> pd.DataFrame:
+        if self.frame is not None and versions == self.versions:
+            return self.frame
+
+        columns = (tuple(left.columns), tuple(left.dtypes), tuple(right.columns), tuple(right.dtypes))
+        left_keys = hash_keys(left, self.on)
+        right_keys = hash_keys(right, self.on)
+        left_signatures = key_signatures(left, left_keys)
+        right_signatures = key_signatures(right, right_keys)
+
+        changed = None
+        if self.frame is not None and columns == self._columns:
+            changed = np.union1d(
+                changed_keys(self._left_signatures, left_signatures),
+                changed_keys(self._right_signatures, right_signatures),
+            )
+            total_keys = max(len(left_signatures), len(right_signatures), 1)
+            if len(changed) > self.max_incremental_fraction * total_keys:
+                changed = None
+
+        if changed is None:
+            self.frame = self._merge(left, right)
+            self._frame_keys = hash_keys(self.frame, self.on)
+            self.rebuilds += 1
+        elif len(changed):
+            # Drop the stored rows of every changed key and append their new join result
+            kept = ~np.isin(self._frame_keys, changed)
+            delta = self._merge(left[np.isin(left_keys, changed)], right[np.isin(right_keys, changed)])
+            self.frame = pd.concat([self.frame[kept], delta], ignore_index=True)
+            self._frame_keys = np.concatenate([self._frame_keys[kept], hash_keys(delta, self.on)])
+            self.incremental_updates += 1
+
+        self.versions = versions
+        self.nbytes = frame_bytes(self.frame)
+        self._columns = columns
+        self._left_signatures = left_signatures
+        self._right_signatures = right_signatures
+        return self.frame
@@ -0,0 +1,51 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+
+class ServerBusyError(Exception):
+    pass
+
+
+class QueryExecutor:
+    # Runs dataframe work on a bounded thread pool instead of the event loop.
+    # Identical requests (same key) that arrive while one is running wait on
+    # that computation instead of starting their own, and new work is refused
+    # once max_workers + max_queue computations are already admitted.
+    # All bookkeeping happens on the event loop thread, so no locks are needed.
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executed = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+        self._in_flight = {}  # key -> asyncio.Future of the running computation
+
+    async def run(self, key: Hashable, fn: Callable, *args) -> Any:
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            if len(self._in_flight) >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ServerBusyError(f"Server busy: {len(self._in_flight)} queries already queued")
+            future = asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+            self._in_flight[key] = future
+            self.executed += 1
+            # Forget the computation when it finishes, not when the first waiter
+            # goes away, so a disconnecting client doesn't break coalescing
+            future.add_done_callback(lambda _, key=key: self._in_flight.pop(key, None))
+        # shield: one waiter being cancelled must not cancel the shared computation
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": len(self._in_flight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,176 @@
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from itertools import count
+from types import MappingProxyType
+from typing import Any, Iterator, Optional
+
+import pandas as pd
+
+from compaction import frame_bytes
+from dataset_store import DatasetStore
+from filter_index import FilterPlan
+from result_cache import hash_filter_config
+
+
+class RegistrySnapshot(Mapping):
+    # One immutable state of the registry: the version of every dataset
+    # (cleared ones keep the version they were cleared at), the filter config
+    # and its compiled plan. Reading a dataset returns the frame of this
+    # snapshot's version, even after newer versions have been published.
+
+    def __init__(self, registry: "DatasetRegistry", generation: int, versions: dict[str, int], names: frozenset,
+                 filter_config: list, filter_plan: FilterPlan, filter_config_hash: str):
+        self._registry = registry
+        self.generation = generation
+        self.versions = MappingProxyType(dict(versions))
+        self.names = names  # Datasets present in this snapshot
+        self.filter_config = filter_config
+        self.filter_plan = filter_plan
+        self.filter_config_hash = filter_config_hash
+
+    def __getitem__(self, dataset_name: str) -> pd.DataFrame:
+        if dataset_name not in self.names:
+            raise KeyError(dataset_name)
+        return self._registry.frame(dataset_name, self.versions[dataset_name])
+
+    def __contains__(self, dataset_name) -> bool:
+        return dataset_name in self.names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self.names))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class DatasetRegistry:
+    # Copy-on-write registry of the stored datasets and the filter config.
+    # Requests read one snapshot from start to finish (`read()`); ingests and
+    # config changes build their frames off to the side and `publish` swaps
+    # in a new snapshot. The frames of the current versions live in the
+    # DatasetStore (memory budget, lazy loading); a superseded frame is kept
+    # aside only while some reader still holds a snapshot of its version, and
+    # dropped as soon as the last of them is done. The lock is only held for
+    # the swap and the reader counts, never while a query or an ingest runs.
+
+    def __init__(self, store: DatasetStore):
+        self.store = store
+        self.reclaimed = 0
+        self._lock = threading.Lock()
+        self._stored_versions = {}  # dataset name -> version of its frame in the store
+        self._retired = {}  # (dataset name, version) -> superseded frame a reader still needs
+        self._readers = {}  # generation -> [snapshot, active readers]
+        self._generations = count(1)
+        self._current = RegistrySnapshot(self, 0, {}, frozenset(), [], FilterPlan([]), hash_filter_config([]))
+
+    def current(self) -> RegistrySnapshot:
+        return self._current
+
+    def stored_version(self, dataset_name: str) -> Optional[int]:
+        return self._stored_versions.get(dataset_name)
+
+    @contextmanager
+    def read(self) -> Iterator[RegistrySnapshot]:
+        with self._lock:
+            snapshot = self._current
+            entry = self._readers.setdefault(snapshot.generation, [snapshot, 0])
+            entry[1] += 1
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._readers[snapshot.generation]
+                    self._reclaim()
+
+    def frame(self, dataset_name: str, version: int) -> pd.DataFrame:
+        # The stored version is checked before and after reading the store:
+        # publish retires the old frame before it marks the new version and
+        # replaces the frame, so a reader racing a publish falls through to
+        # the retired copy instead of returning the newer frame
+        if self._stored_versions.get(dataset_name) == version:
+            try:
+                frame = self.store[dataset_name]
+            except KeyError:  # Cleared meanwhile
+                frame = None
+            if frame is not None and self._stored_versions.get(dataset_name) == version:
+                return frame
+        frame = self._retired.get((dataset_name, version))
+        if frame is None:
+            raise KeyError(f"{dataset_name} version {version} is no longer available")
+        return frame
+
+    def publish(
+        self,
+        frames: Optional[dict[str, tuple[int, pd.DataFrame]]] = None,
+        cleared: Optional[dict[str, int]] = None,
+        filter_config: Optional[list] = None,
+        filter_plan: Optional[FilterPlan] = None,
+    ) -> RegistrySnapshot:
+        # frames: name -> (version, frame) to store; cleared: name -> the version
+        # recorded for a dataset that is removed. Returns the new snapshot.
+        frames = frames or {}
+        cleared = cleared or {}
+        sizes = {name: (frame_bytes(df), len(df)) for name, (version, df) in frames.items()}
+        with self._lock:
+            current = self._current
+            for name in list(frames) + list(cleared):
+                version = current.versions.get(name)
+                if name in current.names and self._has_reader(name, version):
+                    self._retired[(name, version)] = self.store[name]
+            versions = dict(current.versions)
+            names = set(current.names)
+            for name, (version, df) in frames.items():
+                self._stored_versions[name] = version
+                self.store.put(name, df, sizes[name])
+                versions[name] = version
+                names.add(name)
+            for name, version in cleared.items():
+                self._stored_versions.pop(name, None)
+                if name in self.store:
+                    del self.store[name]
+                versions[name] = version
+                names.discard(name)
+            if filter_config is not None:
+                plan = filter_plan or FilterPlan(filter_config)
+                config_hash = hash_filter_config(filter_config)
+            else:
+                filter_config, plan, config_hash = current.filter_config, current.filter_plan, current.filter_config_hash
+            self._current = RegistrySnapshot(self, next(self._generations), versions, frozenset(names), filter_config, plan, config_hash)
+            return self._current
+
+    def restore(self, versions: dict[str, int], filter_config: list, filter_plan: FilterPlan) -> RegistrySnapshot:
+        # Startup: datasets already registered in the store (lazily) under these versions
+        with self._lock:
+            self._stored_versions.update(versions)
+            self._current = RegistrySnapshot(
+                self, next(self._generations), versions, frozenset(versions),
+                filter_config, filter_plan, hash_filter_config(filter_config),
+            )
+            return self._current
+
+    def _has_reader(self, dataset_name: str, version: int) -> bool:
+        # Called with the lock held
+        return any(
+            dataset_name in snapshot.names and snapshot.versions.get(dataset_name) == version
+            for snapshot, readers in self._readers.values()
+        )
+
+    def _reclaim(self) -> None:
+        # Called with the lock held
+        for name, version in list(self._retired):
+            if not self._has_reader(name, version):
+                del self._retired[(name, version)]
+                self.reclaimed += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "generation": self._current.generation,
+                "readers": sum(readers for snapshot, readers in self._readers.values()),
+                "open_snapshots": len(self._readers),
+                "retired": [f"{name}@{version}" for name, version in self._retired],
+                "reclaimed": self.reclaimed,
+            }
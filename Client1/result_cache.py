@@ -0,0 +1,140 @@
+import sys
+import json
+import base64
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import pandas as pd
+
+
+def estimate_size(value: Any) -> int:
+    # Rough in-memory size of a /get-data/ result, used for LRU accounting
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def hash_filter_config(filter_config: list) -> str:
+    return hashlib.sha1(json.dumps(filter_config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def normalize_filter_values(filter_values: dict[str, Any]) -> str:
+    # Empty selections and "All" are ignored by the filters, and the
+    # order of multi-select values doesn't change the result, so drop/sort them
+    normalized = {}
+    for column, values in filter_values.items():
+        if not values or values == "All":
+            continue
+        normalized[column] = sorted(values, key=str) if isinstance(values, list) else values
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+def make_cache_key(dataset_versions: dict[str, int], filter_config_hash: str, filter_values: dict[str, Any], options: tuple = ()) -> tuple:
+    # options: other request parameters that change the result (e.g. the chart granularity)
+    return (
+        tuple(sorted(dataset_versions.items())),
+        filter_config_hash,
+        normalize_filter_values(filter_values),
+        options,
+    )
+
+
+# Dataset versions only count up within one process: a restarted server that
+# ingests the same sheets in the same order hands out the same versions for
+# different data. A random epoch per process is mixed into every ETag and
+# cursor, so none issued before a restart is ever accepted after it.
+BOOT_EPOCH = secrets.token_hex(8)
+
+
+def make_etag(cache_key: tuple, *variant) -> str:
+    # Weak validator: equal for every encoding of the same result
+    return 'W/"' + hashlib.sha1(repr((BOOT_EPOCH, cache_key, variant)).encode()).hexdigest()[:24] + '"'
+
+
+def _cursor_token(cache_key: tuple) -> str:
+    return hashlib.sha1(repr((BOOT_EPOCH, cache_key)).encode()).hexdigest()[:16]
+
+
+def make_cursor(cache_key: tuple, offset: int) -> str:
+    # Opaque page position, bound to the data and filters it was issued for
+    token = _cursor_token(cache_key)
+    return base64.urlsafe_b64encode(f"{offset}:{token}".encode()).decode().rstrip("=")
+
+
+def read_cursor(cursor: str, cache_key: tuple) -> Optional[int]:
+    # The cursor's offset, None if the data or filters changed since it was
+    # issued; raises ValueError for anything that isn't a cursor
+    try:
+        offset, token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        offset = int(offset)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset if token == _cursor_token(cache_key) else None
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+
+class ResultCache:
+    # LRU cache of /get-data/ results, bounded by the estimated size of the stored results.
+    # Results are stored from query worker threads, so every operation takes the lock.
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result) -> None:
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
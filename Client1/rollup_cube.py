@@ -0,0 +1,63 @@
+from typing import Any, Optional
+
+import pandas as pd
+
+from compaction import frame_bytes
+from filter_index import FilterPlan
+
+
+# Filter columns with more distinct values than this fraction of the rows
+# (e.g. one symbol per row) would make the cube as large as the frame itself,
+# so they are left out and queries filtering on them scan rows instead
+CUBE_MAX_UNIQUE_FRACTION = 0.5
+
+
+class RollupCube:
+    # Partial aggregates (sum and non-null count of every measure) per
+    # combination of filter values and group columns. A filtered chart is
+    # answered by selecting the matching cells and adding them up, so its cost
+    # depends on the number of cells rather than the number of rows.
+
+    def __init__(self, df: pd.DataFrame, plan: FilterPlan, group_columns: list[str], measures: list[str]):
+        self.frame_columns = set(df.columns)
+        self.measures = measures
+        self.filter_dims = [
+            column for column in plan.columns
+            if column in df.columns and df[column].nunique(dropna=False) <= CUBE_MAX_UNIQUE_FRACTION * max(len(df), 1)
+        ]
+        self.dims = list(dict.fromkeys(self.filter_dims + [c for c in group_columns if c in df.columns]))
+
+        grouped = df.groupby(self.dims, observed=True, dropna=False, sort=False)[measures]
+        sums = grouped.sum().rename(columns=lambda m: f"{m} sum")
+        counts = grouped.count().rename(columns=lambda m: f"{m} count")
+        self.cells = pd.concat([sums, counts], axis=1).reset_index()
+        self.nbytes = frame_bytes(self.cells)
+
+    def can_answer(self, filter_values: dict[str, Any], plan: FilterPlan) -> bool:
+        # Filters on columns the frame doesn't have are ignored, as in DatasetIndex.filter_rows
+        for column in plan.columns:
+            values = filter_values.get(column)
+            if values and values != "All" and column in self.frame_columns and column not in self.filter_dims:
+                return False
+        return True
+
+    def select(self, filter_values: dict[str, Any]) -> pd.DataFrame:
+        cells = self.cells
+        for column in self.filter_dims:
+            values = filter_values.get(column)
+            if not values or values == "All":
+                continue
+            if isinstance(values, list):  # Checkbox multi-selection with OR logic
+                cells = cells[cells[column].isin(values)]
+            else:
+                cells = cells[cells[column] == str(values)]
+        return cells
+
+    def rollup(self, filter_values: dict[str, Any], by: str) -> Optional[pd.DataFrame]:
+        # "<measure> sum" and "<measure> count" per value of `by`, like
+        # df[filtered].groupby(by)[measure].sum() / .count()
+        if by not in self.dims:
+            return None
+        cells = self.select(filter_values)
+        columns = [f"{m} sum" for m in self.measures] + [f"{m} count" for m in self.measures]
+        return cells.groupby(by, observed=True)[columns].sum()
@@ -3,16 +3,37 @@ import json
 import pandas as pd
 import shutil
 import tempfile
+import weakref
 import uvicorn
-from fastapi import FastAPI, UploadFile, File, Form, Query, Depends, Body, Request
+from fastapi import FastAPI, UploadFile, File, Form, Query, Depends, Body, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional, Any
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from urllib.parse import urlparse
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from io import BytesIO
+from itertools import count
+from dataset_schema import normalize_dataset
+from compaction import compact_dataset, frame_bytes
+from result_cache import ResultCache, etag_matches, hash_filter_config, make_cache_key, make_cursor, make_etag, read_cursor
+from filter_index import DatasetIndex, FilterPlan
+from rollup_cube import RollupCube
+from sheets_fetcher import SheetsFetcher, values_to_dataframe
+from sheet_refresh import SheetState, hash_rows, refresh_sheet
+from upload_jobs import FileProgress, UploadJobManager
+from query_executor import QueryExecutor, ServerBusyError
+from excel_stream import list_sheets
+from wire_format import ARROW_MEDIA_TYPE, FORMATS, render, to_records
+from update_events import UpdateBroadcaster
+from dataset_store import DatasetStore
+from registry import DatasetRegistry, RegistrySnapshot
+from snapshots import SnapshotStore
+from instrumentation import DebugLog, Metrics, RequestMetricsMiddleware, SlowRequestProfiler, frame_size
+from widget_planner import Catalog, MissingDataset, WidgetPlanner
 
 
 app = FastAPI()
@@ -25,11 +46,155 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-datasets = {}
-CHUNK_SIZE = 10000
+# Stored frames are normalized once at ingest and treated as read-only afterwards;
+# copy-on-write keeps derived frames in get_data from writing back into them.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
-# Global FILTER_CONFIG to override the hardcoded one
-FILTER_CONFIG = []
+# Frames of the current dataset versions; requests read them through a
+# registry snapshot (below), never from here directly
+datasets = DatasetStore()
+CHUNK_SIZE = 10000
+# Parallel batchGet requests per Google Sheet ingest
+SHEETS_MAX_WORKERS = int(os.environ.get("SHEETS_MAX_WORKERS", "4"))
+# "streaming" parses uploads row by row into typed column buffers (openpyxl
+# read-only mode) under INGEST_MEMORY_CAP_MB per file; "pandas" uses pd.read_excel
+EXCEL_INGEST_MODE = os.environ.get("EXCEL_INGEST_MODE", "streaming")
+INGEST_MEMORY_CAP_BYTES = int(os.environ.get("INGEST_MEMORY_CAP_MB", "2048")) * 1024 * 1024
+# Worker processes shared by all upload jobs
+INGEST_PROCESSES = int(os.environ.get("INGEST_PROCESSES", str(os.cpu_count() or 1)))
+# Last fetched sheet, header and row hashes per googlesheetN, used for incremental refreshes
+sheet_states = {}
+
+# Version per dataset, bumped whenever the dataset is stored or cleared.
+# Versions come from a single counter so a re-uploaded dataset never reuses an old one.
+_version_counter = count(1)
+
+# Immutable snapshots of every dataset version, the filter config (which
+# overrides the hardcoded one) and its compiled plan (depends_on resolved,
+# topologically ordered). Each request reads one snapshot throughout; ingests
+# and /set-filter-config/ publish a new one with an atomic swap, and frames
+# of superseded versions are freed once the last request reading them ends.
+registry = DatasetRegistry(datasets)
+
+# /get-data/ results keyed on dataset versions, filter config and filter values
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024
+# Compute the unfiltered /get-data/ result right after each ingest
+PREFILL_RESULT_CACHE = os.environ.get("PREFILL_RESULT_CACHE", "0") == "1"
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES)
+
+# /get-data/ computations run on a bounded thread pool (pandas releases the GIL
+# for most of the heavy work); beyond QUERY_WORKERS + QUERY_QUEUE_LIMIT
+# distinct queries in flight, new ones are turned away
+QUERY_WORKERS = int(os.environ.get("QUERY_WORKERS", "4"))
+QUERY_QUEUE_LIMIT = int(os.environ.get("QUERY_QUEUE_LIMIT", "32"))
+query_executor = QueryExecutor(QUERY_WORKERS, QUERY_QUEUE_LIMIT)
+
+# /events/ streams (Server-Sent Events) get a message whenever a dataset or
+# FILTER_CONFIG changes, so dashboards only re-request /get-data/ when needed
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("SSE_KEEPALIVE_SECONDS", "15"))
+update_events = UpdateBroadcaster()
+
+# Durations, rows and bytes per processing stage and latency per route, served
+# in the Prometheus text format at /metrics
+metrics = Metrics()
+app.add_middleware(RequestMetricsMiddleware, metrics=metrics)
+# /get-data/ computations slower than PROFILE_SLOW_REQUESTS_MS keep a sampled
+# profile of their hottest stacks (GET /metrics/slow-requests/); 0 turns the sampler off
+PROFILE_SLOW_REQUESTS_MS = float(os.environ.get("PROFILE_SLOW_REQUESTS_MS", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+slow_request_profiler = SlowRequestProfiler(PROFILE_SLOW_REQUESTS_MS / 1000, PROFILE_SAMPLE_INTERVAL_MS / 1000)
+# DEBUG_LOG=1 prints the frames and options get_data works with, each message
+# at most once per DEBUG_LOG_INTERVAL_SECONDS
+debug_log = DebugLog(os.environ.get("DEBUG_LOG", "0") == "1", float(os.environ.get("DEBUG_LOG_INTERVAL_SECONDS", "10")))
+
+# With SNAPSHOT_DIR set, every stored dataset and FILTER_CONFIG is also written
+# there (Arrow IPC when pyarrow is installed) and reloaded lazily on startup,
+# e.g. SNAPSHOT_DIR=~/.local/share/dynamic-dashboard/snapshots. Unset (the
+# default), everything stays in memory. A directory serves one server process
+# at a time; one that can't be written, or is in use by another server, turns
+# snapshots off with a warning.
+SNAPSHOT_DIR = os.path.expanduser(os.environ.get("SNAPSHOT_DIR", ""))
+snapshot_store = None
+if SNAPSHOT_DIR:
+    try:
+        snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+    except OSError as e:
+        print(f"Warning: Snapshots disabled, can't use {SNAPSHOT_DIR}: {str(e)}")
+
+# Stored frames get the smallest lossless dtypes (categoricals for repetitive
+# text, narrow integers). Above DATASET_MEMORY_BUDGET_MB of loaded frames and
+# the caches derived from them (below), the least recently queried datasets
+# are dropped from memory together with their derived caches, and reloaded
+# from their snapshot on the next query (0 = no budget; needs SNAPSHOT_DIR)
+COMPACT_DATASETS = os.environ.get("COMPACT_DATASETS", "1") == "1"
+DATASET_MEMORY_BUDGET_BYTES = int(os.environ.get("DATASET_MEMORY_BUDGET_MB", "0")) * 1024 * 1024
+if DATASET_MEMORY_BUDGET_BYTES and snapshot_store is None:
+    print("Warning: DATASET_MEMORY_BUDGET_MB has no effect without SNAPSHOT_DIR")
+
+# Frames derived from stored datasets and the filter indexes built over them,
+# rebuilt only when one of their input datasets (or FILTER_CONFIG) changes
+derived_views = {}  # view name -> (input versions, frame, bytes)
+filter_indexes = {}  # view name -> ((input versions, config hash), weakref to the frame, DatasetIndex)
+rollup_cubes = {}  # view name -> ((input versions, config hash), RollupCube)
+
+# Time bucket column the price trend charts are grouped by, per ?granularity=;
+# quarters and months are per year ("2020-Q1", "2020-03"), see dataset_schema.py
+TIME_GRANULARITIES = {"year": "Year", "quarter": "Quarter", "month": "Month"}
+# Points per downsampled time series when /get-data/ has no ?resolution= (about
+# a chart's width in pixels), and the most a request may ask for
+DEFAULT_RESOLUTION = int(os.environ.get("DEFAULT_RESOLUTION", "1000"))
+MAX_RESOLUTION = int(os.environ.get("MAX_RESOLUTION", "10000"))
+# Stocks the heatmap shows by name; the rest are summed into one "Other" tile
+HEATMAP_TOP_N = int(os.environ.get("HEATMAP_TOP_N", "50"))
+# Rows per /get-data/detail/ page when ?limit= isn't given, and the most allowed
+DETAIL_PAGE_ROWS = int(os.environ.get("DETAIL_PAGE_ROWS", "500"))
+MAX_DETAIL_PAGE_ROWS = int(os.environ.get("MAX_DETAIL_PAGE_ROWS", "10000"))
+
+# The /get-data/ dashboard: the frames its charts read and the charts
+# themselves (see widget_planner.py for the spec format). DASHBOARD_SPEC_FILE
+# replaces it with a JSON file of the same shape.
+DASHBOARD_SPEC = {
+    "params": {"time": list(TIME_GRANULARITIES.values())},
+    "sources": {
+        # Rows of googlesheet1 with a valid date and a gold price, in date order
+        # (the stored dataset keeps the sheet's row order for incremental refreshes)
+        "price_trends_clean": {"from": "googlesheet1", "exclude": {"Year": ["", "nan"]}, "not_null": ["Gold Price"], "sort_by": "Date"},
+        # googlesheet2 (S&P 500) joined with googlesheet3 (stocks) on lowercase "sector" and "sym".
+        # Use "market cap" from googlesheet2 and "% stock weight" from googlesheet3.
+        "sp500_stocks": {"join": {
+            "left": "googlesheet2", "right": "googlesheet3", "on": ["sector", "sym"],
+            "suffixes": ["_sp500", "_stocks"], "rename": {"market cap_sp500": "market cap"},
+        }},
+    },
+    "widgets": [
+        {"section": "price_trends", "key": "aggregated_data", "type": "aggregate", "source": "price_trends_clean",
+         "group_by": "$time", "aggregates": [{"column": "Gold Price", "agg": "sum", "as": "value"}]},
+        {"section": "price_trends", "key": "aggregated_housing_price", "type": "aggregate", "source": "price_trends_clean",
+         "group_by": "$time", "aggregates": [{"column": "Housing Price", "agg": "mean", "as": "housing", "pct_change": True, "round": 2}]},
+        {"section": "price_trends", "key": "date", "type": "date_range", "source": "googlesheet1", "column": "Date"},
+        # Daily gold price, downsampled to the request's resolution
+        {"section": "price_trends", "key": "series", "type": "series", "source": "price_trends_clean",
+         "x": "Date", "y": "Gold Price", "method": "lttb"},
+        {"section": "price_trends", "type": "filter_options", "source": "googlesheet1"},
+        # Market cap per sector with its share of the total, first 5 sectors
+        {"section": "sp500_data", "key": "aggregated_data", "type": "aggregate", "source": "sp500_stocks",
+         "group_by": "sector", "aggregates": [{"column": "market cap", "agg": "sum"}],
+         "share": {"column": "market cap", "as": "percentage"}, "round": 1, "rename": {"market cap": "marketcap"}, "limit": 5},
+        # Filtered rows (unaggregated) for the heatmap: the largest stocks by weight
+        # plus an "Other" row for the rest (all rows through /get-data/detail/)
+        {"section": "sp500_data", "key": "stock_data", "type": "rows", "source": "sp500_stocks", "columns": ["sym", "% stock weight"],
+         "top": {"column": "% stock weight", "n": HEATMAP_TOP_N, "other": {"sym": "Other"}}},
+        {"section": "sp500_data", "type": "filter_options", "source": "sp500_stocks"},
+    ],
+}
+DASHBOARD_SPEC_FILE = os.environ.get("DASHBOARD_SPEC_FILE")
+if DASHBOARD_SPEC_FILE:
+    with open(DASHBOARD_SPEC_FILE) as f:
+        DASHBOARD_SPEC = json.load(f)
+dashboard_planner = WidgetPlanner(DASHBOARD_SPEC)
+# Part of every result cache key (and so of every ETag)
+DASHBOARD_SPEC_HASH = hash_filter_config(DASHBOARD_SPEC)
 
 
 SCOPES = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
@@ -43,6 +208,153 @@ def setup_google_sheets():
         print(f"Error setting up Google Sheets: {e}")
         return None
 
+def store_dataset(dataset_name: str, df: pd.DataFrame, normalized: bool = False) -> pd.DataFrame:
+    # Normalize and publish a dataset under a new version
+    with metrics.stage("clean") as stage:
+        if not normalized:
+            df = normalize_dataset(dataset_name, df)
+        if COMPACT_DATASETS:
+            df = compact_dataset(df)
+        stage.rows, stage.bytes = len(df), frame_size(df)
+    version = next(_version_counter)
+    snapshot = registry.publish(frames={dataset_name: (version, df)})
+    # Saving the new version deletes the old one from disk, so this comes after
+    # publishing: until then a request still reading the old version may need it
+    if snapshot_store is not None:
+        try:
+            snapshot_store.save(dataset_name, df, version)
+        except Exception as e:
+            print(f"Warning: Failed to snapshot {dataset_name}: {str(e)}")
+    notify_update(snapshot, "dataset_stored", dataset_name)
+    return df
+
+def publish_upload(dataset_name: str, df: pd.DataFrame) -> None:
+    store_dataset(dataset_name, df)
+    prefill_result_cache()
+
+upload_jobs = UploadJobManager(publish_upload, max_workers=INGEST_PROCESSES, metrics=metrics)
+
+def drop_dataset(dataset_name: str) -> None:
+    sheet_states.pop(dataset_name, None)
+    snapshot = registry.publish(cleared={dataset_name: next(_version_counter)})
+    if snapshot_store is not None:
+        snapshot_store.delete(dataset_name)
+    notify_update(snapshot, "dataset_cleared", dataset_name)
+
+def notify_update(snapshot: RegistrySnapshot, reason: str, dataset_name: Optional[str] = None) -> None:
+    update_events.publish({
+        "type": "update",
+        "reason": reason,
+        "dataset_name": dataset_name,
+        "versions": dict(snapshot.versions),
+        "filter_config_hash": snapshot.filter_config_hash,
+    })
+
+def snapshot_loader(dataset_name: str):
+    # Only a snapshot of the version in memory may replace an evicted frame
+    if snapshot_store is None or snapshot_store.datasets().get(dataset_name) != registry.stored_version(dataset_name):
+        return None
+    return lambda: snapshot_store.load(dataset_name)
+
+def derived_bytes() -> int:
+    # Memory held by the views, joins, filter indexes and cubes built from the
+    # stored datasets; it counts against DATASET_MEMORY_BUDGET_MB too
+    total = sum(entry[2] for entry in list(derived_views.values()))
+    total += sum(entry[2].nbytes for entry in list(filter_indexes.values()))
+    total += sum(entry[1].nbytes for entry in list(rollup_cubes.values()))
+    return total + sum(join.nbytes for join in dashboard_planner.joins.values())
+
+def drop_derived(dataset_name: str) -> None:
+    # Called when dataset_name is evicted: everything built from it goes too,
+    # and is rebuilt (after a reload) by the next query that needs it
+    for cache in (derived_views, filter_indexes, rollup_cubes):
+        for view_name in list(cache):
+            if dataset_name in dashboard_planner.inputs(view_name):
+                cache.pop(view_name, None)
+    for source, join in dashboard_planner.joins.items():
+        if dataset_name in dashboard_planner.inputs(source):
+            join.clear()
+
+datasets.set_budget(DATASET_MEMORY_BUDGET_BYTES, snapshot_loader, derived_bytes, drop_derived)
+
+def restore_snapshots() -> None:
+    # Register every snapshot as a lazily loaded dataset and restore
+    # FILTER_CONFIG, so a restarted server answers /get-data/ without any
+    # re-upload. Frames are only mapped in when a query first reads them.
+    global _version_counter
+    if snapshot_store is None:
+        return
+    try:
+        filter_config = snapshot_store.filter_config()
+        filter_plan = FilterPlan(filter_config)
+    except Exception as e:
+        filter_config, filter_plan = [], FilterPlan([])
+        print(f"Warning: Ignoring snapshot filter config: {str(e)}")
+    versions = snapshot_store.datasets()
+    for dataset_name in versions:
+        datasets.register_lazy(dataset_name, lambda name=dataset_name: snapshot_store.load(name))
+    registry.restore(versions, filter_config, filter_plan)
+    # New versions must not collide with restored ones
+    _version_counter = count(max(versions.values(), default=0) + 1)
+    if versions:
+        print(f"Restored {len(versions)} dataset snapshot(s) from {SNAPSHOT_DIR}: {', '.join(sorted(versions))}")
+
+def get_view(view_name: str, inputs: list[str], build, snapshot: Optional[RegistrySnapshot] = None) -> pd.DataFrame:
+    if snapshot is None:
+        snapshot = registry.current()
+    versions = tuple(snapshot.versions.get(name) for name in inputs)
+    cached = derived_views.get(view_name)
+    if cached is not None and cached[0] == versions:
+        return cached[1]
+    with metrics.stage("clean") as stage:
+        frame = build()
+        stage.rows, stage.bytes = len(frame), frame_size(frame)
+    derived_views[view_name] = (versions, frame, frame_bytes(frame))
+    return frame
+
+def get_filter_index(view_name: str, inputs: list[str], df: pd.DataFrame, snapshot: Optional[RegistrySnapshot] = None) -> DatasetIndex:
+    if snapshot is None:
+        snapshot = registry.current()
+    token = (tuple(snapshot.versions.get(name) for name in inputs), snapshot.filter_config_hash)
+    cached = filter_indexes.get(view_name)
+    # The index holds row positions, so it must have been built on this very
+    # frame: a join updated incrementally reorders its rows, and returns a
+    # different frame for versions it held before (A -> B -> A)
+    if cached is not None and cached[0] == token and cached[1]() is df:
+        return cached[2]
+    index = DatasetIndex(df, snapshot.filter_plan)
+    filter_indexes[view_name] = (token, weakref.ref(df), index)
+    return index
+
+def get_rollup_cube(view_name: str, inputs: list[str], df: pd.DataFrame, group_columns: list[str], measures: list[str],
+                    snapshot: Optional[RegistrySnapshot] = None) -> RollupCube:
+    if snapshot is None:
+        snapshot = registry.current()
+    token = (tuple(snapshot.versions.get(name) for name in inputs), snapshot.filter_config_hash)
+    cached = rollup_cubes.get(view_name)
+    if cached is not None and cached[0] == token:
+        return cached[1]
+    cube = RollupCube(df, snapshot.filter_plan, group_columns, measures)
+    rollup_cubes[view_name] = (token, cube)
+    return cube
+
+catalog = Catalog(get_view, get_filter_index, get_rollup_cube, stage=metrics.stage, log=debug_log)
+
+def prefill_result_cache() -> None:
+    if not PREFILL_RESULT_CACHE:
+        return
+    try:
+        with registry.read() as snapshot:
+            cache_key = make_cache_key(snapshot.versions, snapshot.filter_config_hash, {}, ("year", DEFAULT_RESOLUTION, DASHBOARD_SPEC_HASH))
+            if result_cache.get(cache_key) is None:
+                result = build_dashboard({}, "year", DEFAULT_RESOLUTION, snapshot)
+                if result.get("success"):
+                    result_cache.put(cache_key, result)
+    except Exception as e:
+        print(f"Warning: Failed to prefill result cache: {str(e)}")
+
+restore_snapshots()
+
 def get_sheet_id_from_url(url):
     try:
         parsed = urlparse(url)
@@ -55,13 +367,20 @@ def get_sheet_id_from_url(url):
 
 @app.post("/set-filter-config/")
 async def set_filter_config(data: dict = Body(...)):
-    global FILTER_CONFIG
     try:
-        FILTER_CONFIG = json.loads(data["filterConfig"])  # Parse JSON string
+        filter_config = json.loads(data["filterConfig"])  # Parse JSON string
         # Convert "dependsOn" to "depends_on" for backend compatibility
-        for config in FILTER_CONFIG:
+        for config in filter_config:
             if "dependsOn" in config:
                 config["depends_on"] = config.pop("dependsOn")
+        # Compile the dependency graph once; an invalid config leaves the current one in place
+        snapshot = registry.publish(filter_config=filter_config, filter_plan=FilterPlan(filter_config))
+        if snapshot_store is not None:
+            try:
+                snapshot_store.save_filter_config(filter_config)
+            except Exception as e:
+                print(f"Warning: Failed to snapshot the filter config: {str(e)}")
+        notify_update(snapshot, "filter_config_changed")
         return {"success": True, "message": "Filter config set successfully"}
     except Exception as e:
         import traceback
@@ -74,9 +393,8 @@ async def get_sheet_names(sheet_url: str = Form(...), auth_token: str = Form(...
         sheet_id = get_sheet_id_from_url(sheet_url)
         if not sheet_id:
             return {"success": False, "error": "Invalid Google Sheet URL"}
-        creds = Credentials(token=auth_token)
-        service = build("sheets", "v4", credentials=creds)
-        spreadsheet = service.spreadsheets().get(spreadsheetId=sheet_id).execute()
+        service = build_sheets_service(auth_token)
+        spreadsheet = await run_in_threadpool(service.spreadsheets().get(spreadsheetId=sheet_id).execute)
         sheets = spreadsheet.get("sheets", [])
         sheet_names = [sheet["properties"]["title"] for sheet in sheets if "title" in sheet["properties"]]
         return {"success": True, "sheet_names": sheet_names}
@@ -92,11 +410,10 @@ async def get_excel_sheet_names(file: UploadFile = File(...)):
     temp_file = None
     try:
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx")
-        with open(temp_file.name, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        xl = pd.ExcelFile(temp_file.name, engine="openpyxl")
-        sheet_names = xl.sheet_names
-        xl.close()
+        temp_file.close()
+        await run_in_threadpool(spool_upload_to, file, temp_file.name)
+        # Read-only mode only loads the workbook index, not the sheet contents
+        sheet_names = await run_in_threadpool(list_sheets, temp_file.name)
         print(f"Excel sheet names: {sheet_names}")
         return {"success": True, "sheet_names": sheet_names}
     except Exception as e:
@@ -111,53 +428,112 @@ async def get_excel_sheet_names(file: UploadFile = File(...)):
                 print(f"Warning: Failed to delete temp file {temp_file.name}: {str(e)}")
 
 
+def spool_upload_to(file: UploadFile, path: str) -> None:
+    # Copy the upload to disk in 1 MB pieces instead of reading it into memory
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer, length=1024 * 1024)
+
+def spool_upload(file: UploadFile) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as buffer:
+        path = buffer.name
+    spool_upload_to(file, path)
+    return path
+
 @app.post("/upload-files/")
 async def upload_files(
     files: List[UploadFile] = File(...),
-    sheet_names: List[Optional[str]] = Form(default_factory=lambda: [])
+    sheet_names: List[Optional[str]] = Form(default_factory=lambda: []),
+    wait: bool = Form(False)  # Block until every file is published, like the old synchronous upload
 ):
-    global datasets
     try:
+        # Spool every upload to disk, then parse the files and sheets in a background job
+        uploads = []
         for i, file in enumerate(files, 1):
-            # Use BytesIO for in-memory streaming
-            content = await file.read()  # Read the entire file into memory
-            excel_file = BytesIO(content)
-            
-            # Read Excel file using openpyxl
-            chunks = []
-            xl = pd.ExcelFile(excel_file, engine="openpyxl")
             sheet_name = sheet_names[i-1] if i-1 < len(sheet_names) and sheet_names[i-1] else None
-            available_sheets = xl.sheet_names
-            
-            # Process each sheet (up to 4-5, or as specified)
-            for sheet in [sheet_name] if sheet_name else available_sheets[:5]:  # Limit to 5 sheets for safety
-                df = pd.read_excel(
-                    excel_file,
-                    sheet_name=sheet,
-                    engine="openpyxl",
-                    dtype_backend='numpy_nullable'  # Faster type inference for large datasets
-                )
-                chunks.append(df)  # Keep full data, no aggregation
-            
-            # Combine all sheets into a single full DataFrame (if multiple sheets)
-            final_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
-            
-            # Store full (unaggregated) DataFrame in datasets
-            datasets[f"excelsheet{i}"] = final_df
-            print(f"Stored excelsheet{i} with {len(final_df)} rows from sheet(s): {sheet_name or ', '.join(available_sheets[:5])}")
-        
-        return {"success": True, "message": f"{len(files)} files uploaded and processed successfully"}
+            temp_path = await run_in_threadpool(spool_upload, file)
+            uploads.append(FileProgress(f"excelsheet{i}", file.filename, temp_path, sheet_name))
+        job = upload_jobs.submit(uploads, EXCEL_INGEST_MODE, INGEST_MEMORY_CAP_BYTES)
+
+        if not wait:
+            return {"success": True, "job_id": job.job_id, "message": f"{len(files)} files queued for processing"}
+
+        await job.done.wait()
+        if job.status != "done":
+            errors = [f"{f.filename}: {f.error}" for f in job.files if f.error]
+            return {"success": False, "job_id": job.job_id, "error": "; ".join(errors) or f"Upload job {job.status}"}
+        return {"success": True, "job_id": job.job_id, "message": f"{len(files)} files uploaded and processed successfully"}
     except Exception as e:
         import traceback
         traceback.print_exc()
         return {"success": False, "error": str(e)}
 
+@app.get("/upload-jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return {"success": False, "error": f"Upload job {job_id} not found"}
+    return {"success": True, **job.to_dict()}
+
+@app.post("/upload-jobs/{job_id}/cancel")
+async def cancel_upload_job(job_id: str):
+    job = upload_jobs.cancel(job_id)
+    if job is None:
+        return {"success": False, "error": f"Upload job {job_id} not found"}
+    return {"success": True, **job.to_dict()}
+
+def build_sheets_service(auth_token: str):
+    return build("sheets", "v4", credentials=Credentials(token=auth_token), cache_discovery=False)
+
+def build_drive_service(auth_token: str):
+    return build("drive", "v3", credentials=Credentials(token=auth_token), cache_discovery=False)
+
+def ingest_google_sheet(sheet_id: str, auth_token: str, sheet_name: str, dataset_name: str, mode: str = "auto") -> tuple[pd.DataFrame, dict]:
+    # Only the used range is read, in CHUNK_SIZE-row blocks batched into parallel batchGet calls
+    fetcher = SheetsFetcher(
+        lambda: build_sheets_service(auth_token), sheet_id, sheet_name,
+        block_rows=CHUNK_SIZE, max_workers=SHEETS_MAX_WORKERS,
+        drive_factory=lambda: build_drive_service(auth_token),
+    )
+    # Read before any rows, so an edit made while they download changes it
+    revision = fetcher.revision() if mode != "full" else None
+
+    # Refreshing the sheet already stored in this dataset downloads nothing when
+    # its Drive revision is unchanged and re-checks every block otherwise
+    # ("append" only downloads the last known block and anything after it)
+    state = sheet_states.get(dataset_name)
+    refreshed = None
+    # Read the stored frame through a snapshot, so a concurrent clear can't free it midway
+    with registry.read() as snapshot:
+        if mode in ("auto", "verify", "append") and state is not None and dataset_name in snapshot \
+                and (state.spreadsheet_id, state.sheet_name) == (sheet_id, sheet_name):
+            stored_df = snapshot[dataset_name]
+            refreshed = refresh_sheet(
+                fetcher, state, stored_df,
+                lambda df: normalize_dataset(dataset_name, df), mode=mode, revision=revision,
+            )
+        if refreshed is not None:
+            final_df, sheet_states[dataset_name], report = refreshed
+            if final_df is not stored_df:
+                store_dataset(dataset_name, final_df, normalized=True)
+            print(f"Refreshed {dataset_name} in {fetcher.requests_made} requests: {report}")
+            return final_df, report
+
+    header, rows = fetcher.fetch_all()
+    print(f"Fetched {len(rows)} rows from sheet {sheet_name} in {fetcher.requests_made} requests")
+    # Store full (unaggregated), normalized DataFrame in datasets
+    with metrics.stage("parse", rows=len(rows)):
+        raw_df = values_to_dataframe(header, rows)
+    final_df = store_dataset(dataset_name, raw_df)
+    sheet_states[dataset_name] = SheetState(sheet_id, sheet_name, header, hash_rows(rows), revision)
+    return final_df, {"mode": "full", "rows_added": len(final_df), "rows_changed": 0, "rows_removed": 0, "rows_unchanged": 0, "not_checked": 0}
+
 @app.post("/process-google-sheet/")
 async def process_google_sheet(
     sheet_url: str = Form(...),
     auth_token: str = Form(...),
     sheet_name: str = Form("Sheet1"),
-    sheet_index: int = Form(1)
+    sheet_index: int = Form(1),
+    refresh_mode: str = Form("auto")  # "auto" (skip an unchanged sheet), "append", "verify" or "full"
 ):
     global datasets
     try:
@@ -165,45 +541,16 @@ async def process_google_sheet(
         if not sheet_id:
             return {"success": False, "error": "Invalid Google Sheet URL"}
         
-        creds = Credentials(token=auth_token)
-        service = build("sheets", "v4", credentials=creds)
-
-        # Get sheet dimensions to optimize range
-        sheet_properties = service.spreadsheets().get(spreadsheetId=sheet_id).execute()["sheets"][0]["properties"]
-        grid_properties = sheet_properties.get("gridProperties", {})
-        row_count = grid_properties.get("rowCount", 1000000)  # Default to 1M if not specified
-        col_count = grid_properties.get("columnCount", 26)    # Default to 26 (Z) if not specified
-
-        # Estimate data range (e.g., A1 to the last used column/row, capped at 500,000 cells per request)
-        max_cells = 500000  # Google Sheets API limit per request
-        rows_per_request = min(row_count, max_cells // col_count)
-        if rows_per_request <= 0:
-            rows_per_request = 1000  # Fallback for small sheets
-
-        chunks = []
-        for start_row in range(0, row_count, rows_per_request):
-            end_row = min(start_row + rows_per_request, row_count)
-            range_str = f"{sheet_name}!A{start_row + 1}:Z{end_row}"
-            result = service.spreadsheets().values().get(spreadsheetId=sheet_id, range=range_str).execute()
-            values = result.get("values", [])
-            
-            if not values:
-                continue
-            
-            if not chunks:  # First chunk provides headers
-                header = values[0] if values else ["default_column"]
-                chunks.append(pd.DataFrame(values[1:], columns=header))
-            else:
-                chunks.append(pd.DataFrame(values, columns=header))
-
-        # Combine chunks into a single full (unaggregated) DataFrame
-        final_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
-        # Store full (unaggregated) DataFrame in datasets
+        # Download and parse off the event loop so other endpoints keep responding
         dataset_name = f"googlesheet{sheet_index}"
-        datasets[dataset_name] = final_df
+        with metrics.stage("ingest") as stage:
+            final_df, refresh = await run_in_threadpool(ingest_google_sheet, sheet_id, auth_token, sheet_name, dataset_name, refresh_mode)
+            stage.rows = len(final_df)
         print(f"Stored {dataset_name} with {len(final_df)} rows from sheet: {sheet_name}")
         
-        return {"success": True, "message": "Google Sheet processed successfully", "dataset_name": dataset_name}
+        # Builds the whole dashboard, so it runs off the event loop like the ingest
+        await run_in_threadpool(prefill_result_cache)
+        return {"success": True, "message": "Google Sheet processed successfully", "dataset_name": dataset_name, "refresh": refresh}
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -213,49 +560,18 @@ async def process_google_sheet(
 async def clear_dataset(dataset_name: str = Form(...)):
     global datasets
     try:
-        if dataset_name in datasets:
-            del datasets[dataset_name]
+        if dataset_name in registry.current():
+            drop_dataset(dataset_name)
             return {"success": True, "message": f"Cleared dataset {dataset_name}"}
         else:
             return {"success": False, "error": f"Dataset {dataset_name} not found"}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def get_filtered_dataframe(df: pd.DataFrame, filter_values: dict[str, Any]) -> pd.DataFrame:
-    filtered_df = df
-    for filter_config in FILTER_CONFIG:
-        column = filter_config["column"]
-        if column in filter_values and filter_values[column] and filter_values[column] != "All" and column in df.columns:
-            values = filter_values[column]
-            if isinstance(values, list):  # Handle checkbox multi-selection with OR logic
-                filtered_df = filtered_df[filtered_df[column].isin(values)]
-            else:  # Handle single-selection or unexpected strings
-                filtered_df = filtered_df[filtered_df[column] == str(values)]
-    return filtered_df
-
-def get_filter_options(df: pd.DataFrame, filter_values: dict[str, Any]) -> dict[str, list[str]]:
-    filter_options = {}
-    temp_df = df
-    for filter_config in FILTER_CONFIG:
-        current_df = temp_df
-        column = filter_config["column"]
-        if filter_config.get("depends_on"):
-            for dep_id in filter_config["depends_on"]:
-                dep_column = next(f["column"] for f in FILTER_CONFIG if f["id"] == dep_id)
-                if dep_column in filter_values and filter_values[dep_column] and filter_values[dep_column] != "All" and dep_column in df.columns:
-                    values = filter_values[dep_column]
-                    if isinstance(values, list):
-                        current_df = current_df[current_df[dep_column].isin(values)]
-                    else:
-                        current_df = current_df[current_df[dep_column] == str(values)]
-        if column in current_df.columns:
-            filter_options[f"{column.lower()}_options"] = sorted(current_df[column].dropna().unique().tolist())
-    return filter_options
-
 def get_filter_params(request: Request) -> dict[str, Any]:
     params = {}
     # Parse query params or body for arrays (assuming JSON-encoded arrays in query or body)
-    for config in FILTER_CONFIG:
+    for config in registry.current().filter_config:
         column = config["column"]
         value = request.query_params.get(column, None)
         if value:
@@ -271,179 +587,234 @@ def get_filter_params(request: Request) -> dict[str, Any]:
                 params[column] = value  # Fallback to string
     return params
 
+@app.get("/cache-stats/")
+async def cache_stats():
+    return {
+        "success": True,
+        **result_cache.stats(),
+        "executor": query_executor.stats(),
+        "event_subscribers": update_events.subscribers,
+        "snapshots": snapshot_store.stats() if snapshot_store is not None else None,
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Stage and route metrics plus the cache, executor and dataset counters, for Prometheus to scrape
+    cache = result_cache.stats()
+    executor = query_executor.stats()
+    store = datasets.stats()
+    extra = [
+        ("dashboard_result_cache_entries", "gauge", "Entries in the result cache", [({}, cache["entries"])]),
+        ("dashboard_result_cache_bytes", "gauge", "Estimated bytes held by the result cache", [({}, cache["bytes"])]),
+        ("dashboard_result_cache_hits_total", "counter", "Result cache hits", [({}, cache["hits"])]),
+        ("dashboard_result_cache_misses_total", "counter", "Result cache misses", [({}, cache["misses"])]),
+        ("dashboard_result_cache_evictions_total", "counter", "Result cache evictions", [({}, cache["evictions"])]),
+        ("dashboard_queries_in_flight", "gauge", "Distinct /get-data/ computations running or queued", [({}, executor["in_flight"])]),
+        ("dashboard_queries_executed_total", "counter", "/get-data/ computations run", [({}, executor["executed"])]),
+        ("dashboard_queries_coalesced_total", "counter", "/get-data/ requests that joined a running computation", [({}, executor["coalesced"])]),
+        ("dashboard_queries_rejected_total", "counter", "/get-data/ requests turned away while busy", [({}, executor["rejected"])]),
+        ("dashboard_dataset_loaded_bytes", "gauge", "Bytes of dataset frames in memory", [({}, store["loaded_bytes"])]),
+        ("dashboard_dataset_derived_bytes", "gauge", "Bytes of views, joins, filter indexes and cubes built from the datasets", [({}, store["derived_bytes"])]),
+        ("dashboard_dataset_rows", "gauge", "Rows per dataset", [
+            ({"dataset": name}, info["rows"]) for name, info in sorted(store["datasets"].items()) if info["rows"] is not None
+        ]),
+        ("dashboard_dataset_evictions_total", "counter", "Datasets dropped from memory under the budget", [({}, store["evictions"])]),
+        ("dashboard_dataset_reloads_total", "counter", "Evicted datasets reloaded from their snapshot", [({}, store["reloads"])]),
+        ("dashboard_event_subscribers", "gauge", "Open /events/ streams", [({}, update_events.subscribers)]),
+        ("dashboard_slow_requests_total", "counter", "Profiled /get-data/ computations over PROFILE_SLOW_REQUESTS_MS", [({}, slow_request_profiler.slow_requests)]),
+    ]
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/slow-requests/")
+async def slow_requests():
+    # Sampled profiles of the latest slow /get-data/ computations, newest first
+    return {
+        "success": True,
+        "enabled": slow_request_profiler.enabled,
+        "threshold_ms": PROFILE_SLOW_REQUESTS_MS,
+        "profiles": slow_request_profiler.profiles(),
+    }
+
+@app.get("/dataset-stats/")
+async def dataset_stats():
+    # Bytes and rows per dataset, whether it is in memory, and the memory budget
+    stats = datasets.stats()
+    versions = registry.current().versions
+    for name, info in stats["datasets"].items():
+        info["version"] = versions.get(name)
+    return {"success": True, **stats, "registry": registry.stats()}
+
+@app.get("/events/")
+async def events(request: Request):
+    # Server-Sent Events: the current versions first, then one "update" event per change
+    queue = update_events.subscribe()
+    snapshot = registry.current()
+    initial = {"type": "hello", "versions": dict(snapshot.versions), "filter_config_hash": snapshot.filter_config_hash}
+    return StreamingResponse(
+        update_events.stream(queue, initial, request.is_disconnected, SSE_KEEPALIVE_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/get-data/")
-async def get_data(filter_values: dict[str, str] = Depends(get_filter_params)):
-    global datasets  # Access the global datasets dictionary where all uploaded data is stored
+async def get_data(
+    request: Request,
+    filter_values: dict[str, str] = Depends(get_filter_params),
+    granularity: str = Query("year"),  # Price trend time buckets: "year", "quarter" or "month"
+    resolution: int = Query(DEFAULT_RESOLUTION),  # Points per time series, e.g. the chart's width in pixels
+    response_format: Optional[str] = Query(None, alias="format")  # Opt-in encoded response: "json", "columnar" or "arrow"
+):
     try:
         # Log the filter values received from the frontend (e.g., {"Category": "Electronics"})
-        print("Received filter_values:", filter_values)
-
-
-        # Check if any data has been uploaded
-        if not datasets:
-            return {"success": False, "error": "No datasets available. Please upload files or provide a Google Sheet URL."}
-
-        # Combine all datasets (Excel and Google Sheets) into one DataFrame
-        # combined_df = pd.concat([df for df in datasets.values()], ignore_index=True)
-        # print(f"Processing combined dataset with {len(combined_df)} rows")
-
-        # # Ensure "Value" column is numeric, converting non-numeric to 0
-        # if "Value" in combined_df.columns:
-        #     combined_df["Value"] = pd.to_numeric(combined_df["Value"], errors="coerce").fillna(0)
-
-        # Prepare filter columns from filter_values, ignoring None values
-
-        month_order = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-        Price_trends = datasets["googlesheet1"]
-
-        print("------------", Price_trends)
-        if "Gold Price" in Price_trends.columns:
-            # First, clean commas from the values
-            Price_trends["Gold Price"] = Price_trends["Gold Price"].astype(str).str.replace(',', '')
-            # Then convert to numeric
-            Price_trends["Gold Price"] = pd.to_numeric(Price_trends["Gold Price"], errors="coerce").fillna(0)
-
-
-        if "Housing Price" in Price_trends.columns:
-            Price_trends["Housing Price"] = pd.to_numeric(Price_trends["Housing Price"], errors="coerce").fillna(0)
-        
-        if "Date" in Price_trends.columns:
-            Price_trends["Date"] = pd.to_datetime(Price_trends["Date"], errors="coerce")
-            # Extract year and month, handling NaN cleanly
-            Price_trends["Year"] = Price_trends["Date"].dt.year.apply(lambda x: str(int(x)) if pd.notna(x) else "")
-            Price_trends["Month"] = Price_trends["Date"].dt.strftime('%b').fillna("")
-        print("------------Price_trends----------------", Price_trends)
-    
-
-        
-
-
-        Price_trends_Clean = Price_trends[(Price_trends["Year"] != "") & (Price_trends["Year"] != "nan") & Price_trends["Gold Price"].notna()]
-        print("----++++++++++++++++++------Price_trends_Clean----------------", Price_trends)
-
-        filter_columns = {key: value for key, value in filter_values.items() if value is not None and value != "All"}
-
-        # Apply filters
-        filtered_df = get_filtered_dataframe(Price_trends_Clean, filter_columns)
-        filtered_df["Month"] = pd.Categorical(filtered_df["Month"], categories=month_order, ordered=True)
-
-        # Get filter options
-        price_trends_filter_options = get_filter_options(Price_trends, filter_columns)
-
-        # if filter_values["Year"] != "":
-        #     aggregated_data = filtered_df.groupby("Month")["Gold Price"].sum().reset_index().rename(columns={"Gold Price": "value"}).to_dict(orient="records")
-        #     aggregated_housing_price = (
-        #         filtered_df.groupby("Month")["Housing Price"]
-        #         .mean()
-        #         .pct_change()
-        #         .mul(100)
-        #         .round(2)                
-        #         .fillna(0)  # Avoid NaN in the first row
-        #         .reset_index()
-        #         .rename(columns={"Housing Price": "housing"})
-        #         .to_dict(orient="records")
-                
-        #     )
-        # else:
-        aggregated_data = filtered_df.groupby("Year")["Gold Price"].sum().reset_index().rename(columns={"Gold Price": "value"}).to_dict(orient="records")
-        aggregated_housing_price = (
-            filtered_df.groupby("Year")["Housing Price"]
-            .mean()
-            .pct_change()
-            .mul(100)
-            .round(2)
-            .fillna(0)  # Avoid NaN in the first row
-            .reset_index()
-            .rename(columns={"Housing Price": "housing"})
-            .to_dict(orient="records")
-        )
-
-        
-        
-        price_trends = {
-            "aggregated_data": aggregated_data,
-            "aggregated_housing_price": aggregated_housing_price,
-            "date": Price_trends["Date"],
-            **price_trends_filter_options
-        }
-
-        sp500_Data = datasets.get("googlesheet2")
-        stocks = datasets.get("googlesheet3")
-
-        if sp500_Data is None or stocks is None:
-            return {"success": False, "error": "S&P500 or Stock data not available."}
-
-        # Convert all column names to lowercase for consistency
-        sp500_Data.columns = sp500_Data.columns.str.lower()
-        stocks.columns = stocks.columns.str.lower()
-
-        print("sp500_Data columns:", sp500_Data.columns.tolist())
-        print("stocks columns:", stocks.columns.tolist())
-
-        # Process excelsheet2 (Market Cap data)
-        if "market cap" in sp500_Data.columns:
-            sp500_Data["market cap"] = pd.to_numeric(sp500_Data["market cap"], errors="coerce").fillna(0)
-
-        if "% stock weight" in stocks.columns:
-            # Clean percentage strings (e.g., '3.45%' -> 0.0345)
-            stocks["% stock weight"] = stocks["% stock weight"].astype(str).str.replace('%', '').str.strip()
-            stocks["% stock weight"] = pd.to_numeric(stocks["% stock weight"], errors="coerce") / 100  # Convert to decimal (e.g., 3.45 -> 0.0345)
-            stocks["% stock weight"] = stocks["% stock weight"].fillna(0)  # Handle any NaN values
-        
-        # Join datasets on lowercase "sector" and "sym", with suffixes to avoid conflicts
-        joined_df = pd.merge(sp500_Data, stocks, on=["sector", "sym"], how="inner", suffixes=('_sp500', '_stocks'))
-        print("Joined DataFrame columns:", joined_df.columns.tolist())
-
-        # Use "market cap" from excelsheet2 (sp500_Data) and "% stock weight" from excelsheet3 (stocks)
-        joined_df = joined_df.rename(columns={"market cap_sp500": "market cap"})  # Rename to original lowercase
-        print("Renamed Joined DataFrame columns:", joined_df.columns.tolist())
-
-        filter_columns = {key: value for key, value in filter_values.items() if value is not None}
-
-        filtered_joined_df = get_filtered_dataframe(joined_df, filter_columns)
-        print("Filtered joined columns:", filtered_joined_df.columns.tolist())
-
-        filter_options_sp500 = get_filter_options(joined_df, filter_columns)
-        print("Filter options:", filter_options_sp500)
-
-        # Group by sector and sum the market capitalization (from excelsheet2)
-        sector_marketcap = filtered_joined_df.groupby("sector")["market cap"].sum().reset_index()
-
-        # Calculate the total market capitalization
-        total_market_cap = sector_marketcap["market cap"].sum()
-
-        # Add a percentage column for each sector
-        sector_marketcap["percentage"] = (sector_marketcap["market cap"] / total_market_cap) * 100
-
-        # Rename 'market cap' to 'marketcap' for consistency
-        sector_marketcap = sector_marketcap.round(1).rename(columns={"market cap": "marketcap"})
-
-        # Convert to a list of dictionaries
-        sp500_sector_aggregated = sector_marketcap.head(5).to_dict(orient="records")
+        debug_log("filter_values", lambda: filter_values)
+
+        # One registry snapshot for the whole request: datasets and the filter
+        # config published meanwhile don't show up halfway through it
+        with registry.read() as snapshot:
+            # Check if any data has been uploaded
+            if not snapshot:
+                return {"success": False, "error": "No datasets available. Please upload files or provide a Google Sheet URL."}
+            if granularity not in TIME_GRANULARITIES:
+                return {"success": False, "error": f"Invalid granularity '{granularity}', expected one of: {', '.join(TIME_GRANULARITIES)}"}
+            if not 2 <= resolution <= MAX_RESOLUTION:
+                return {"success": False, "error": f"Invalid resolution {resolution}, expected 2 to {MAX_RESOLUTION} points"}
+            if response_format is None and ARROW_MEDIA_TYPE in request.headers.get("accept", ""):
+                response_format = "arrow"
+            if response_format is not None and response_format not in FORMATS:
+                return {"success": False, "error": f"Invalid format '{response_format}', expected one of: {', '.join(FORMATS)}"}
+
+            # Repeat refreshes with unchanged data, config and filters are served from the cache
+            cache_key = make_cache_key(snapshot.versions, snapshot.filter_config_hash, filter_values, (granularity, resolution, DASHBOARD_SPEC_HASH))
+            # The key changes whenever the answer can, so a client that still holds
+            # the response for it gets a 304 without anything being computed
+            etag = make_etag(cache_key, response_format)
+            if_none_match = request.headers.get("if-none-match")
+            if if_none_match and etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+            result = result_cache.get(cache_key)
+            if result is None:
+                # Identical concurrent requests share one computation on the query pool
+                result = await query_executor.run(cache_key, compute_dashboard, cache_key, filter_values, granularity, resolution, snapshot)
+            validators = {"ETag": etag, "Cache-Control": "no-cache"} if result.get("success") else {}
+
+            # Encoded bodies are cached next to the result, per format and content
+            # encoding, so a repeat request doesn't encode the result again either
+            accept_encoding = request.headers.get("accept-encoding") if response_format is not None else None
+            render_key = (cache_key, response_format, accept_encoding)
+            rendered = result_cache.get(render_key)
+            if rendered is None:
+                with metrics.stage("serialize") as stage:
+                    if response_format is None:
+                        rendered = await run_in_threadpool(render_default, result)
+                    else:
+                        rendered = await run_in_threadpool(render, result, response_format, accept_encoding)
+                    stage.bytes = len(rendered[0])
+                if result.get("success"):
+                    result_cache.put(render_key, rendered)
+            body, media_type, headers = rendered
+            return Response(content=body, media_type=media_type, headers={**headers, **validators})
+
+    except ServerBusyError as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return {"success": False, "error": str(e)}
 
-        # Return full filtered data for excelsheet3 (unaggregated) for heatmap
-        stock_data = filtered_joined_df[["sym", "% stock weight"]].to_dict(orient="records")
+def render_default(result: dict) -> tuple[bytes, str, dict[str, str]]:
+    # The body FastAPI would send for the result as a plain dict: the layout
+    # (one object per row) and encoding the frontend has always read
+    encoded = JSONResponse(jsonable_encoder(to_records(result)))
+    return bytes(encoded.body), encoded.media_type, {}
+
+def encode_json(content: Any, headers: Optional[dict] = None) -> JSONResponse:
+    # The body FastAPI would send for `content`, encoded inside the "serialize"
+    # stage (returning the dict would encode it only after the stage ended)
+    with metrics.stage("serialize") as stage:
+        encoded = JSONResponse(jsonable_encoder(content), headers=headers)
+        stage.bytes = len(encoded.body)
+    return encoded
+
+def compute_dashboard(cache_key: tuple, filter_values: dict[str, Any], granularity: str = "year",
+                      resolution: int = DEFAULT_RESOLUTION, snapshot: Optional[RegistrySnapshot] = None) -> dict[str, Any]:
+    # Runs on a query worker thread
+    with slow_request_profiler.watch(f"/get-data/ granularity={granularity} resolution={resolution} filters={filter_values}"):
+        result = build_dashboard(filter_values, granularity, resolution, snapshot)
+    if result.get("success"):
+        result_cache.put(cache_key, result)
+    # The computation may have built new derived caches
+    datasets.trim()
+    return result
+
+def build_dashboard(filter_values: dict[str, Any], granularity: str = "year", resolution: int = DEFAULT_RESOLUTION,
+                    snapshot: Optional[RegistrySnapshot] = None) -> dict[str, Any]:
+    # Every widget of DASHBOARD_SPEC for one request. Widgets reading the same
+    # source share its filtered rows, filter options and grouped aggregates;
+    # widgets whose datasets aren't loaded are left out and listed under
+    # "missing_datasets" rather than failing the whole response.
+    params = {"time": TIME_GRANULARITIES[granularity], "resolution": resolution}
+    try:
+        if snapshot is None:
+            with registry.read() as snapshot:
+                return dashboard_planner.run(catalog, snapshot, filter_values, params)
+        return dashboard_planner.run(catalog, snapshot, filter_values, params)
 
-        sp500_data = {
-            "aggregated_data": sp500_sector_aggregated,
-            "stock_data": stock_data,
-            **filter_options_sp500
-        }
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return {"success": False, "error": str(e)}
 
 
-        # Return the response with calculated data
-        return {
+@app.get("/get-data/detail/")
+async def get_data_detail(
+    filter_values: dict[str, str] = Depends(get_filter_params),
+    widget: str = Query(...),  # A widget listed under "detail" in /get-data/, e.g. "sp500_data.stock_data"
+    cursor: Optional[str] = Query(None),  # next_cursor of the previous page; none for the first page
+    limit: int = Query(DETAIL_PAGE_ROWS),
+):
+    # The full rows behind a downsampled or top-N widget, one page at a time.
+    # A cursor only works for the data and filters it was issued for; after an
+    # ingest or a filter config change the client starts again from the first page.
+    try:
+        if not 1 <= limit <= MAX_DETAIL_PAGE_ROWS:
+            return {"success": False, "error": f"Invalid limit {limit}, expected 1 to {MAX_DETAIL_PAGE_ROWS} rows"}
+        try:
+            dashboard_planner.detail_widget(widget)
+        except KeyError:
+            return {"success": False, "error": f"Unknown widget '{widget}'"}
+        with registry.read() as snapshot:
+            if not snapshot:
+                return {"success": False, "error": "No datasets available. Please upload files or provide a Google Sheet URL."}
+            cache_key = make_cache_key(snapshot.versions, snapshot.filter_config_hash, filter_values, ("detail", widget, DASHBOARD_SPEC_HASH))
+            offset = 0
+            if cursor:
+                try:
+                    offset = read_cursor(cursor, cache_key)
+                except ValueError as e:
+                    return {"success": False, "error": str(e)}
+                if offset is None:
+                    return {"success": False, "error": "Cursor expired: the data or filters changed, request the first page again"}
+            page, total = await run_in_threadpool(
+                dashboard_planner.page, catalog, snapshot, filter_values, widget, offset, limit
+            )
+            datasets.trim()
+        return encode_json({
             "success": True,
-            "price_trends": price_trends,
-            "sp500_data" : sp500_data    
-        }
-    
+            "widget": widget,
+            "rows": to_records(page),
+            "offset": offset,
+            "total": total,
+            "next_cursor": make_cursor(cache_key, offset + limit) if offset + limit < total else None,
+        })
+
+    except MissingDataset as e:
+        return {"success": False, "error": f"Datasets not available: {e.args[0]}"}
     except Exception as e:
         import traceback
         traceback.print_exc()
         return {"success": False, "error": str(e)}
-    
-    
+
+
 if __name__ == "__main__":
     import sys
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
@@ -0,0 +1,98 @@
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from sheets_fetcher import SheetsFetcher, join_blocks, values_to_dataframe
+
+
+def hash_rows(rows: list[list]) -> np.ndarray:
+    return np.array([hash(tuple(row)) for row in rows], dtype=np.int64)
+
+
+class SheetState:
+    # What was last fetched into a googlesheetN dataset: the source sheet, its
+    # header, one hash per data row (row i sits at sheet row i + 2), so a
+    # block's checksum is the slice of row hashes it covers, and the Drive
+    # revision the rows were read at (None if it couldn't be read)
+
+    def __init__(self, spreadsheet_id: str, sheet_name: str, header: list[str], row_hashes: np.ndarray, revision: Optional[str] = None):
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.header = header
+        self.row_hashes = row_hashes
+        self.revision = revision
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.row_hashes)
+
+
+def refresh_sheet(
+    fetcher: SheetsFetcher,
+    state: SheetState,
+    stored_df: pd.DataFrame,
+    normalize: Callable[[pd.DataFrame], pd.DataFrame],
+    mode: str = "auto",
+    revision: Optional[str] = None,
+) -> Optional[tuple[pd.DataFrame, SheetState, dict]]:
+    # Patch the stored frame with the blocks whose rows changed since `state`.
+    # "verify" re-fetches every block. "auto" first compares the spreadsheet's
+    # Drive revision (read by the caller before anything else, so edits made
+    # during the fetch show up next time): an unchanged revision skips the
+    # fetch altogether, anything else (or no revision) is a verify. "append"
+    # trusts the sheet to only grow and re-fetches just the last known block
+    # plus anything after it; rows before that are reported as not_checked.
+    # Returns None when the sheet changed shape and needs a full reload.
+    if mode == "auto" and revision is not None and revision == state.revision and len(stored_df) == state.num_rows:
+        return stored_df, state, {
+            "mode": "unchanged", "blocks_fetched": 0, "rows_added": 0, "rows_changed": 0,
+            "rows_removed": 0, "rows_unchanged": state.num_rows, "not_checked": 0,
+        }
+
+    header, num_rows = fetcher.used_range()
+    if header != state.header or len(stored_df) != state.num_rows:
+        return None
+
+    block_rows = fetcher.block_rows
+    first_block = (state.num_rows - 1) // block_rows if mode == "append" and state.num_rows else 0
+    fetched = fetcher.fetch_from(first_block, max(num_rows, state.num_rows), len(header))
+    block_numbers = sorted(fetched)
+    # Pad intermediate blocks exactly as a full fetch would
+    new_rows = join_blocks([fetched[b] for b in block_numbers], block_rows)
+
+    start = first_block * block_rows
+    old_hashes = state.row_hashes[start:]
+    new_hashes = hash_rows(new_rows)
+    overlap = min(len(old_hashes), len(new_hashes))
+    rows_changed = int(np.count_nonzero(old_hashes[:overlap] != new_hashes[:overlap]))
+    rows_added = max(len(new_hashes) - len(old_hashes), 0)
+    rows_removed = max(len(old_hashes) - len(new_hashes), 0)
+    report = {
+        "mode": "append" if mode == "append" else "verify",
+        "blocks_fetched": len(block_numbers),
+        "rows_added": rows_added,
+        "rows_changed": rows_changed,
+        "rows_removed": rows_removed,
+        "rows_unchanged": len(old_hashes) - rows_changed - rows_removed,
+        "not_checked": start,  # Rows before the first fetched block
+    }
+    # The stored rows only match the revision if every row was compared
+    if start:
+        revision = None
+    if not (rows_changed or rows_added or rows_removed):
+        return stored_df, SheetState(state.spreadsheet_id, state.sheet_name, header, state.row_hashes, revision), report
+
+    # Keep stored rows for untouched blocks, normalize only the blocks that differ
+    pieces = [stored_df.iloc[:start]] if start else []
+    for offset in range(0, len(new_rows), block_rows):
+        block_old = old_hashes[offset:offset + block_rows]
+        block_new = new_hashes[offset:offset + block_rows]
+        if len(block_old) == len(block_new) and np.array_equal(block_old, block_new):
+            pieces.append(stored_df.iloc[start + offset:start + offset + len(block_new)])
+        else:
+            pieces.append(normalize(values_to_dataframe(header, new_rows[offset:offset + block_rows])))
+    patched = pd.concat(pieces, ignore_index=True) if pieces else stored_df.iloc[:0]
+
+    new_state = SheetState(state.spreadsheet_id, state.sheet_name, header, np.concatenate([state.row_hashes[:start], new_hashes]), revision)
+    return patched, new_state, report
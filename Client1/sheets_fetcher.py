@@ -0,0 +1,191 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import pandas as pd
+
+
+MAX_CELLS_PER_REQUEST = 500000  # Google Sheets API limit per request
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def column_letter(number: int) -> str:
+    # 1 -> A, 26 -> Z, 27 -> AA
+    letters = ""
+    while number > 0:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def quote_sheet_name(sheet_name: str) -> str:
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+
+class SheetsFetcher:
+    # Downloads one sheet in fixed-size row blocks. Blocks are grouped into
+    # batchGet requests of at most MAX_CELLS_PER_REQUEST cells, which run in
+    # parallel on a bounded thread pool with retry and exponential backoff.
+    # googleapiclient services aren't thread-safe, so each worker thread gets
+    # its own service from service_factory.
+
+    def __init__(
+        self,
+        service_factory: Callable,
+        spreadsheet_id: str,
+        sheet_name: str,
+        block_rows: int = 10000,
+        max_workers: int = 4,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        drive_factory: Optional[Callable] = None,
+    ):
+        self.service_factory = service_factory
+        self.drive_factory = drive_factory  # Drive v3 service, for revision()
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.block_rows = block_rows
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.requests_made = 0
+        self.row_limit = None  # Rows in the sheet grid, ranges may not go past it
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _service(self):
+        if not hasattr(self._local, "service"):
+            self._local.service = self.service_factory()
+        return self._local.service
+
+    def _execute(self, make_request):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._lock:
+                    self.requests_made += 1
+                return make_request(self._service()).execute()
+            except Exception as e:
+                status = getattr(getattr(e, "resp", None), "status", None)
+                # Rate limits, server errors and dropped connections are worth retrying
+                retryable = int(status) in RETRY_STATUSES if status is not None else isinstance(e, OSError)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random() * 0.5)
+                print(f"Sheets request failed ({status or e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def revision(self) -> Optional[str]:
+        # Drive's version number of the spreadsheet file, bumped by every edit
+        # to any of its sheets. None when it can't be read (no drive_factory,
+        # or a token without Drive access): callers then can't skip anything.
+        if self.drive_factory is None:
+            return None
+        try:
+            drive = self.drive_factory()
+            file = self._execute(lambda s: drive.files().get(fileId=self.spreadsheet_id, fields="version"))
+        except Exception as e:
+            print(f"Warning: Can't read the Drive revision of {self.spreadsheet_id}: {str(e)}")
+            return None
+        return file.get("version")
+
+    def used_range(self) -> tuple[list[str], int]:
+        # Header row gives the used columns, the first column a lower bound on
+        # the used rows (column A can be shorter than the others, or blank)
+        sheet = quote_sheet_name(self.sheet_name)
+        properties = self._execute(lambda s: s.spreadsheets().get(
+            spreadsheetId=self.spreadsheet_id, ranges=[sheet], fields="sheets.properties.gridProperties"
+        )).get("sheets", [{}])[0].get("properties", {})
+        self.row_limit = properties.get("gridProperties", {}).get("rowCount")
+        header = self._execute(lambda s: s.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id, range=f"{sheet}!1:1"
+        )).get("values", [])
+        header = header[0] if header else []
+        first_column = self._execute(lambda s: s.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id, range=f"{sheet}!A:A", majorDimension="COLUMNS"
+        )).get("values", [])
+        num_rows = len(first_column[0]) - 1 if first_column else 0
+        return header, max(num_rows, 0)
+
+    def block_range(self, block: int, num_cols: int) -> str:
+        # Block 0 starts right below the header row
+        start_row = 2 + block * self.block_rows
+        end_row = start_row + self.block_rows - 1
+        if self.row_limit:
+            end_row = min(end_row, self.row_limit)
+        return f"{quote_sheet_name(self.sheet_name)}!A{start_row}:{column_letter(num_cols)}{end_row}"
+
+    def num_blocks(self) -> Optional[int]:
+        # Blocks that fit in the sheet grid (None if the grid size isn't known)
+        if not self.row_limit:
+            return None
+        return -(-max(self.row_limit - 1, 0) // self.block_rows)
+
+    def fetch_blocks(self, blocks: list[int], num_cols: int) -> dict[int, list[list]]:
+        if not blocks:
+            return {}
+        blocks_per_request = max(1, MAX_CELLS_PER_REQUEST // max(1, self.block_rows * num_cols))
+        batches = [blocks[i:i + blocks_per_request] for i in range(0, len(blocks), blocks_per_request)]
+
+        def fetch_batch(batch):
+            ranges = [self.block_range(block, num_cols) for block in batch]
+            response = self._execute(lambda s: s.spreadsheets().values().batchGet(
+                spreadsheetId=self.spreadsheet_id, ranges=ranges
+            ))
+            value_ranges = response.get("valueRanges", [])
+            return {block: (value_ranges[i].get("values", []) if i < len(value_ranges) else []) for i, block in enumerate(batch)}
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+            for fetched in pool.map(fetch_batch, batches):
+                results.update(fetched)
+        return results
+
+    def fetch_from(self, first_block: int, num_rows: int, num_cols: int) -> dict[int, list[list]]:
+        # Every block from first_block up to the used rows reported by used_range(),
+        # then the blocks past them: other columns can run past column A, so
+        # the next max_workers blocks are probed in parallel for as long as the
+        # last block read comes back full
+        num_blocks = max(-(-num_rows // self.block_rows), first_block)
+        blocks = self.fetch_blocks(list(range(first_block, num_blocks)), num_cols)
+
+        block = num_blocks
+        grid_blocks = self.num_blocks()
+        while (block == first_block or len(blocks[block - 1]) == self.block_rows) and (grid_blocks is None or block < grid_blocks):
+            probe = list(range(block, block + max(1, self.max_workers)))
+            if grid_blocks is not None:
+                probe = probe[:grid_blocks - block]
+            blocks.update(self.fetch_blocks(probe, num_cols))
+            block = probe[-1] + 1
+        return blocks
+
+    def fetch_all(self) -> tuple[list[str], list[list]]:
+        header, num_rows = self.used_range()
+        if not header:
+            return [], []
+        blocks = self.fetch_from(0, num_rows, len(header))
+        return header, join_blocks([blocks[b] for b in sorted(blocks)], self.block_rows)
+
+
+def join_blocks(blocks: list[list[list]], block_rows: int) -> list[list]:
+    # The API drops trailing empty rows of each range; pad every block but the
+    # last so rows keep their position, then drop trailing empty rows overall
+    rows = []
+    for i, values in enumerate(blocks):
+        rows.extend(values)
+        if i < len(blocks) - 1:
+            rows.extend([] for _ in range(block_rows - len(values)))
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def values_to_dataframe(header: list[str], rows: list[list]) -> pd.DataFrame:
+    # One DataFrame straight from the value arrays; short rows (the API drops
+    # trailing empty cells) are padded by pandas, cells past the header are cut
+    if not header:
+        return pd.DataFrame()
+    width = len(header)
+    if any(len(row) > width for row in rows):
+        rows = [row[:width] for row in rows]
+    return pd.DataFrame(rows, columns=header)
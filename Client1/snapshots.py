@@ -0,0 +1,203 @@
+import os
+import json
+import threading
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # No directory lock where fcntl is unavailable (Windows)
+    fcntl = None
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # Snapshots fall back to pickle files without pyarrow
+    pa = None
+    feather = None
+
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+SNAPSHOT_FORMATS = ("arrow", "pickle")
+
+
+def _write_atomic(path: str, write) -> None:
+    # Write to a temp file and rename it over the target, so a crash never
+    # leaves a half-written file behind
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+class SnapshotStore:
+    # On-disk copy of the datasets registry: one file per dataset plus a
+    # manifest with FILTER_CONFIG and the version of every snapshot.
+    # Datasets are written as uncompressed Arrow IPC files so they can be
+    # memory-mapped on load: numeric columns are then backed by the page
+    # cache, shared by every process that maps the same file. Frames Arrow
+    # can't represent (mixed-type object columns) are pickled instead.
+    # The manifest lives in memory and is rewritten whole, so a directory is
+    # locked to one server process while its store is open.
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.writes = 0
+        self.loads = 0
+        self._lock = threading.Lock()  # Ingests write from several threads
+        os.makedirs(directory, exist_ok=True)
+        # Fail here rather than on every save when the directory exists read-only
+        if not os.access(directory, os.W_OK | os.X_OK):
+            raise PermissionError(f"Permission denied: '{directory}'")
+        self._lock_file = self._lock_directory()
+        self.manifest = self._read_manifest()
+        self._check_entries()
+
+    def _lock_directory(self):
+        if fcntl is None:
+            return None
+        lock_file = open(os.path.join(self.directory, LOCK_FILE), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise OSError(f"'{self.directory}' is in use by another server process")
+        return lock_file  # Held (and the lock with it) for the life of the process
+
+    def _read_manifest(self) -> dict:
+        # A manifest that can't be parsed (e.g. truncated by a full disk) is
+        # dropped with a warning; the server then starts without snapshots
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        empty = {"datasets": {}, "filter_config": []}
+        if not os.path.exists(path):
+            return empty
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+            if not isinstance(manifest, dict) or not isinstance(manifest.get("datasets"), dict) \
+                    or not isinstance(manifest.get("filter_config", []), list):
+                raise ValueError("unexpected layout")
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable snapshot manifest {path}: {str(e)}")
+            return empty
+        manifest.setdefault("filter_config", [])
+        return manifest
+
+    def _check_entries(self) -> None:
+        # Drop entries whose file is missing or unreadable, so a broken
+        # snapshot is never restored as a dataset that fails every query, and
+        # delete data files no entry refers to (left behind by a crash or a
+        # dropped manifest)
+        dropped = False
+        for dataset_name, entry in list(self.manifest["datasets"].items()):
+            try:
+                if not isinstance(entry, dict) or entry.get("format") not in SNAPSHOT_FORMATS:
+                    raise ValueError(f"unexpected entry {entry!r}")
+                entry["version"], entry["rows"] = int(entry["version"]), int(entry["rows"])
+                path = self._path(dataset_name, entry["version"], entry["format"])
+                if entry["format"] == "arrow":
+                    if pa is None:
+                        raise ValueError("pyarrow is not installed")
+                    # Reads only the footer; a truncated file fails here
+                    pa.ipc.open_file(pa.memory_map(path)).schema
+                elif not os.path.isfile(path):
+                    raise FileNotFoundError(f"No such file: '{path}'")
+            except Exception as e:
+                print(f"Warning: Dropping snapshot of {dataset_name}: {str(e)}")
+                del self.manifest["datasets"][dataset_name]
+                dropped = True
+        if dropped:
+            self._write_manifest()
+
+        referenced = {
+            os.path.basename(self._path(name, entry["version"], entry["format"]))
+            for name, entry in self.manifest["datasets"].items()
+        }
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith((".arrow", ".pickle", ".tmp")) and file_name not in referenced:
+                try:
+                    os.unlink(os.path.join(self.directory, file_name))
+                except OSError as e:
+                    print(f"Warning: Failed to delete stale snapshot file {file_name}: {str(e)}")
+
+    def _write_manifest(self) -> None:
+        def write(temp_path):
+            with open(temp_path, "w") as f:
+                json.dump(self.manifest, f, default=str)
+        _write_atomic(os.path.join(self.directory, MANIFEST_FILE), write)
+
+    def _path(self, dataset_name: str, version: int, fmt: str) -> str:
+        # The version is part of the name so a slow write of an old version
+        # can never replace the file of a newer one
+        return os.path.join(self.directory, f"{dataset_name}.{version}.{fmt}")
+
+    def _remove(self, entry: Optional[dict], dataset_name: str) -> None:
+        if entry is None:
+            return
+        path = self._path(dataset_name, entry["version"], entry["format"])
+        # Frames already mapped from the file stay valid after the unlink
+        if os.path.exists(path):
+            os.unlink(path)
+
+    def datasets(self) -> dict[str, int]:
+        # dataset name -> version of its snapshot
+        return {name: entry["version"] for name, entry in self.manifest["datasets"].items()}
+
+    def filter_config(self) -> list:
+        return self.manifest.get("filter_config", [])
+
+    def save(self, dataset_name: str, df: pd.DataFrame, version: int) -> None:
+        fmt = "pickle"
+        if feather is not None:
+            try:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                _write_atomic(self._path(dataset_name, version, "arrow"), lambda p: feather.write_feather(table, p, compression="uncompressed"))
+                fmt = "arrow"
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+                print(f"Snapshot of {dataset_name} falls back to pickle: {str(e)}")
+        if fmt == "pickle":
+            _write_atomic(self._path(dataset_name, version, "pickle"), lambda p: df.to_pickle(p))
+
+        entry = {"format": fmt, "version": version, "rows": len(df)}
+        with self._lock:
+            previous = self.manifest["datasets"].get(dataset_name)
+            if previous is not None and previous["version"] > version:
+                stale = entry  # A newer version of this dataset was saved concurrently
+            else:
+                self.manifest["datasets"][dataset_name] = entry
+                self._write_manifest()
+                self.writes += 1
+                stale = previous
+        self._remove(stale, dataset_name)
+
+    def delete(self, dataset_name: str) -> None:
+        with self._lock:
+            entry = self.manifest["datasets"].pop(dataset_name, None)
+            self._write_manifest()
+        self._remove(entry, dataset_name)
+
+    def save_filter_config(self, filter_config: list) -> None:
+        with self._lock:
+            self.manifest["filter_config"] = filter_config
+            self._write_manifest()
+
+    def load(self, dataset_name: str) -> Optional[pd.DataFrame]:
+        entry = self.manifest["datasets"].get(dataset_name)
+        if entry is None:
+            return None
+        self.loads += 1
+        path = self._path(dataset_name, entry["version"], entry["format"])
+        if entry["format"] == "arrow":
+            # split_blocks keeps each column its own block, so numeric columns
+            # stay zero-copy views of the mapped file instead of being consolidated
+            table = feather.read_table(path, memory_map=True)
+            return table.to_pandas(split_blocks=True)
+        return pd.read_pickle(path)
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "datasets": {name: {"format": e["format"], "version": e["version"], "rows": e["rows"]} for name, e in self.manifest["datasets"].items()},
+            "writes": self.writes,
+            "loads": self.loads,
+        }
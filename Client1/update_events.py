@@ -0,0 +1,77 @@
+import json
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+
+def format_sse(event: dict, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event.get('type', 'message')}")
+    lines.append(f"data: {json.dumps(event, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class UpdateBroadcaster:
+    # Fans out "data changed" events to every open /events/ stream. Ingests
+    # publish from worker threads, so delivery is handed to the event loop
+    # the subscribers live on. A slow subscriber only loses its oldest events.
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self.published = 0
+        self._subscribers = set()
+        self._loop = None
+        self._next_id = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, event: dict) -> None:
+        # Safe to call from any thread; a no-op while nobody listens
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        self.published += 1
+        try:
+            if loop.is_running() and asyncio.get_running_loop() is loop:
+                self._deliver(event)
+                return
+        except RuntimeError:  # No loop in this thread
+            pass
+        try:
+            loop.call_soon_threadsafe(self._deliver, event)
+        except RuntimeError:  # Loop already closed
+            pass
+
+    def _deliver(self, event: dict) -> None:
+        self._next_id += 1
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait((self._next_id, event))
+
+    async def stream(self, queue: asyncio.Queue, initial: dict, is_disconnected: Callable[[], Awaitable[bool]], keepalive_seconds: float) -> AsyncIterator[str]:
+        # SSE text for one subscriber: the current state first, then every
+        # published event, with a comment line as keepalive while idle
+        try:
+            yield format_sse(initial)
+            while not await is_disconnected():
+                try:
+                    event_id, event = await asyncio.wait_for(queue.get(), timeout=keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, event_id)
+        finally:
+            self.unsubscribe(queue)
@@ -0,0 +1,148 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+
+from excel_stream import list_sheets, read_excel_file
+
+
+class FileProgress:
+    def __init__(self, dataset_name: str, filename: str, path: str, sheet_name: Optional[str]):
+        self.dataset_name = dataset_name
+        self.filename = filename
+        self.path = path
+        self.sheet_name = sheet_name
+        self.sheets = []
+        self.sheets_done = 0
+        self.rows = 0
+        self.status = "queued"  # queued -> parsing -> published | failed | cancelled
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return {
+            "dataset_name": self.dataset_name,
+            "filename": self.filename,
+            "status": self.status,
+            "sheets": self.sheets,
+            "sheets_done": self.sheets_done,
+            "rows": self.rows,
+            "error": self.error,
+        }
+
+
+class UploadJob:
+    def __init__(self, files: list[FileProgress]):
+        self.job_id = uuid.uuid4().hex
+        self.files = files
+        self.status = "running"  # running -> done | failed | cancelled
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancelled = False
+        self.futures = []
+        self.task = None  # Held so the running job can't be garbage collected
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "files": [f.to_dict() for f in self.files],
+        }
+
+
+class UploadJobManager:
+    # Runs uploads in the background: every file is parsed (all of its
+    # sheets into one frame) in its own worker process, and each dataset is
+    # published through `publish` as soon as its file is parsed. Only the
+    # finished frame crosses back from the worker.
+
+    def __init__(self, publish: Callable[[str, pd.DataFrame], None], max_workers: int, max_jobs: int = 100, metrics=None):
+        self.publish = publish
+        self.metrics = metrics  # Optional instrumentation.Metrics for the ingest and parse stages
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()  # job id -> UploadJob, oldest first
+        self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def submit(self, files: list[FileProgress], mode: str, memory_cap_bytes: Optional[int]) -> UploadJob:
+        job = UploadJob(files)
+        self.jobs[job.job_id] = job
+        while len(self.jobs) > self.max_jobs:
+            self.jobs.popitem(last=False)
+        job.task = asyncio.get_running_loop().create_task(self._run(job, mode, memory_cap_bytes))
+        return job
+
+    def get(self, job_id: str) -> Optional[UploadJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[UploadJob]:
+        # Queued files are dropped; files already being parsed finish but are discarded
+        job = self.jobs.get(job_id)
+        if job is not None and job.status == "running":
+            job.cancelled = True
+            for future in job.futures:
+                future.cancel()
+        return job
+
+    async def _run_file(self, job: UploadJob, progress: FileProgress, mode: str, memory_cap_bytes: Optional[int]):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            progress.sheets = [progress.sheet_name] if progress.sheet_name else (await run_in_threadpool(list_sheets, progress.path))[:5]
+            progress.status = "parsing"
+            future = loop.run_in_executor(self._executor(), read_excel_file, progress.path, progress.sheets, mode, memory_cap_bytes)
+            job.futures.append(future)
+            parse_started = time.perf_counter()
+            final_df = await future
+            if self.metrics is not None:
+                # Wall time in the pool, including any wait for a free worker
+                self.metrics.observe_stage("parse", time.perf_counter() - parse_started, len(final_df))
+            progress.sheets_done = len(progress.sheets)
+            progress.rows = len(final_df)
+            if job.cancelled:
+                progress.status = "cancelled"
+                return
+            await run_in_threadpool(self.publish, progress.dataset_name, final_df)
+            progress.status = "published"
+            if self.metrics is not None:
+                self.metrics.observe_stage("ingest", time.perf_counter() - started, len(final_df))
+            print(f"Stored {progress.dataset_name} with {len(final_df)} rows from sheet(s): {', '.join(progress.sheets)}")
+        except asyncio.CancelledError:
+            progress.status = "cancelled"
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            progress.status = "cancelled" if job.cancelled else "failed"
+            progress.error = str(e)
+
+    async def _run(self, job: UploadJob, mode: str, memory_cap_bytes: Optional[int]):
+        try:
+            await asyncio.gather(*(self._run_file(job, f, mode, memory_cap_bytes) for f in job.files))
+        finally:
+            for f in job.files:
+                if os.path.exists(f.path):
+                    try:
+                        os.unlink(f.path)
+                    except Exception as e:
+                        print(f"Warning: Failed to delete temp file {f.path}: {str(e)}")
+            if job.cancelled:
+                job.status = "cancelled"
+            elif any(f.status == "failed" for f in job.files):
+                job.status = "failed"
+            else:
+                job.status = "done"
+            job.finished_at = time.time()
+            job.done.set()
@@ -0,0 +1,402 @@
+from contextlib import nullcontext
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from downsample import METHODS, downsample, top_with_other
+from filter_index import DatasetIndex
+from materialized_join import MaterializedJoin
+
+
+# A dashboard spec declares the frames widgets read ("sources") and the
+# widgets themselves; every /get-data/ request runs all widgets together.
+#
+#   sources:
+#     {"dataset": "googlesheet1"}                                   a stored dataset (also implied by any
+#                                                                   widget source that isn't declared)
+#     {"from": "<source>", "exclude": {col: [values]}, "not_null": [cols], "sort_by": col}
+#                                                                   rows of another source
+#     {"join": {"left": .., "right": .., "on": [..], "suffixes": [..], "rename": {..}}}
+#   widgets (each lands in result[section][key]):
+#     {"type": "aggregate", "source", "group_by": col or "$param", "aggregates": [
+#         {"column", "agg": sum|mean|count|min|max, "as", "pct_change": bool, "round": n}],
+#      "share": {"column", "as"}, "round": n, "rename": {..}, "top": {"column", "n"}, "limit": n}
+#     {"type": "filter_options", "source"}          merged into the section as <column>_options
+#     {"type": "date_range", "source", "column"}    min / max / count of a date column (unfiltered)
+#     {"type": "rows", "source", "columns": [..]}   the filtered rows themselves, or with
+#      "top": {"column", "n", "other": {col: value}} the n largest plus one row summing the rest
+#     {"type": "series", "source", "x", "y", "method": lttb|minmax, "points": n}
+#                                                   the filtered rows downsampled to the request's
+#                                                   "resolution" param (else "points") points; the
+#                                                   source must be sorted by x (see "sort_by")
+#   params: {"time": ["Year", ...]}   columns a "$time" group_by can resolve to per request
+#   orders: {"Month": ["Jan", ...]}   value order for group keys that don't sort alphabetically
+#
+# Sharing between widgets of one request: each source is resolved, indexed
+# and filtered at most once, filter options are computed once per source, and
+# all aggregates grouped by the same key of the same source come from one
+# grouped pass (or one rollup of the source's cube).
+#
+# Reduced widgets (series, rows with "top") are listed under "detail" in the
+# result with the number of rows behind them; `page` returns those rows in
+# slices, so the first paint doesn't grow with the data.
+
+WIDGET_TYPES = ("aggregate", "filter_options", "date_range", "rows", "series")
+AGGREGATES = ("sum", "mean", "count", "min", "max")
+# Aggregates a rollup cube answers from its partial sums and counts
+CUBE_AGGREGATES = ("sum", "mean", "count")
+# Points of a series widget when neither the request nor the widget says
+DEFAULT_POINTS = 1000
+
+
+class MissingDataset(KeyError):
+    pass
+
+
+class Catalog:
+    # The server's version-keyed caches of derived views, filter indexes and
+    # rollup cubes; each is called with the snapshot the request reads
+
+    def __init__(
+        self,
+        get_view: Callable,
+        get_filter_index: Callable,
+        get_rollup_cube: Callable,
+        stage: Optional[Callable] = None,
+        log: Optional[Callable] = None,
+    ):
+        self.get_view = get_view
+        self.get_filter_index = get_filter_index
+        self.get_rollup_cube = get_rollup_cube
+        self.stage = stage or (lambda name, **kwargs: nullcontext(_NoStage()))
+        self.log = log or (lambda key, message: None)
+
+
+class _NoStage:
+    rows = None
+    bytes = None
+
+
+def summarize_dates(dates: pd.Series) -> dict[str, Any]:
+    # Range of a date column instead of every raw value
+    valid = dates.dropna()
+    return {
+        "min": valid.min().isoformat() if len(valid) else None,
+        "max": valid.max().isoformat() if len(valid) else None,
+        "count": int(len(valid)),
+        "rows": int(len(dates)),
+    }
+
+def select_rows(df: pd.DataFrame, definition: dict) -> pd.DataFrame:
+    mask = pd.Series(True, index=df.index)
+    for column, values in definition.get("exclude", {}).items():
+        mask &= ~df[column].isin(values)
+    for column in definition.get("not_null", []):
+        mask &= df[column].notna()
+    df = df[mask]
+    if "sort_by" in definition:
+        df = df.sort_values(definition["sort_by"], kind="stable", na_position="last")
+    return df
+
+def ordered(series: pd.Series, order: list) -> pd.Series:
+    position = {value: i for i, value in enumerate(order)}
+    return series.sort_index(key=lambda index: pd.Index([position.get(value, len(order)) for value in index]))
+
+
+class WidgetPlanner:
+    # A compiled dashboard spec: sources and widgets validated once, the
+    # group columns and measures of each source's rollup cube worked out
+    # from the widgets that read it, and one MaterializedJoin per join source.
+
+    def __init__(self, spec: dict):
+        self.params = {name: list(columns) for name, columns in spec.get("params", {}).items()}
+        self.orders = spec.get("orders", {})
+        self.sources = {}
+        for name, definition in spec.get("sources", {}).items():
+            kinds = [kind for kind in ("dataset", "from", "join") if kind in definition]
+            if len(kinds) != 1:
+                raise ValueError(f"Source '{name}' needs exactly one of 'dataset', 'from' or 'join'")
+            self.sources[name] = definition
+        self.joins = {
+            name: MaterializedJoin(
+                on=definition["join"]["on"],
+                suffixes=tuple(definition["join"].get("suffixes", ("_x", "_y"))),
+                rename=definition["join"].get("rename"),
+            )
+            for name, definition in self.sources.items() if "join" in definition
+        }
+
+        self.widgets = []
+        for i, widget in enumerate(spec.get("widgets", [])):
+            kind = widget.get("type")
+            if kind not in WIDGET_TYPES:
+                raise ValueError(f"Widget {i} has unknown type '{kind}', expected one of: {', '.join(WIDGET_TYPES)}")
+            if "source" not in widget or "section" not in widget or (kind != "filter_options" and "key" not in widget):
+                raise ValueError(f"Widget {i} needs 'source', 'section' and (except filter_options) 'key'")
+            if kind == "aggregate":
+                self.group_choices(widget["group_by"])
+                if not widget.get("aggregates"):
+                    raise ValueError(f"Widget {i} needs at least one aggregate")
+                for aggregate in widget.get("aggregates", []):
+                    if aggregate.get("agg") not in AGGREGATES:
+                        raise ValueError(f"Widget {i} has unknown aggregate '{aggregate.get('agg')}'")
+            if kind == "series":
+                if "x" not in widget or "y" not in widget:
+                    raise ValueError(f"Widget {i} needs 'x' and 'y'")
+                if widget.get("method", "lttb") not in METHODS:
+                    raise ValueError(f"Widget {i} has unknown method '{widget['method']}', expected one of: {', '.join(METHODS)}")
+            if kind == "rows" and "top" in widget and ("column" not in widget["top"] or "n" not in widget["top"]):
+                raise ValueError(f"Widget {i} needs 'column' and 'n' in 'top'")
+            self.widgets.append(widget)
+        for definition in self.sources.values():
+            parents = [definition["from"]] if "from" in definition else [definition["join"]["left"], definition["join"]["right"]] if "join" in definition else []
+            for parent in parents:
+                self.inputs(parent)  # Raises on cycles
+
+        # Per source: every column a widget may group by and every aggregated
+        # column (the layout of its cube), and whether a cube can answer all
+        # of its aggregates
+        self.cube_layouts = {}
+        for widget in self.widgets:
+            if widget["type"] != "aggregate":
+                continue
+            groups, measures = self.cube_layouts.setdefault(widget["source"], ([], []))
+            groups.extend(c for c in self.group_choices(widget["group_by"]) if c not in groups)
+            for aggregate in widget["aggregates"]:
+                if aggregate["column"] not in measures:
+                    measures.append(aggregate["column"])
+        self.cube_ready = {
+            source: all(a["agg"] in CUBE_AGGREGATES for w in self.widgets if w["type"] == "aggregate" and w["source"] == source for a in w["aggregates"])
+            for source in self.cube_layouts
+        }
+
+    def group_choices(self, group_by: str) -> list[str]:
+        if group_by.startswith("$"):
+            if group_by[1:] not in self.params:
+                raise ValueError(f"Unknown spec param '{group_by}'")
+            return self.params[group_by[1:]]
+        return [group_by]
+
+    def inputs(self, source: str, seen: tuple = ()) -> list[str]:
+        # Stored datasets a source is derived from
+        if source in seen:
+            raise ValueError(f"Source '{source}' depends on itself")
+        definition = self.sources.get(source, {"dataset": source})
+        if "dataset" in definition:
+            return [definition["dataset"]]
+        if "from" in definition:
+            return self.inputs(definition["from"], seen + (source,))
+        return self.inputs(definition["join"]["left"], seen + (source,)) + self.inputs(definition["join"]["right"], seen + (source,))
+
+    def detail_widget(self, widget_id: str) -> dict:
+        # A reduced widget by "<section>.<key>", as listed under "detail"
+        for widget in self.widgets:
+            if widget["type"] in ("rows", "series") and f"{widget['section']}.{widget.get('key')}" == widget_id:
+                return widget
+        raise KeyError(widget_id)
+
+    def run(self, catalog: Catalog, snapshot, filter_values: dict[str, Any], params: dict[str, Any]) -> dict[str, Any]:
+        # `snapshot`: the datasets (name -> frame) with their `versions` and the `filter_plan` to use
+        return PlannedRequest(self, catalog, snapshot, filter_values, params).run()
+
+    def page(self, catalog: Catalog, snapshot, filter_values: dict[str, Any], widget_id: str, offset: int, limit: int) -> tuple[pd.DataFrame, int]:
+        # Rows offset..offset + limit of a reduced widget's full detail, and the number of rows
+        widget = self.detail_widget(widget_id)
+        columns = [widget["x"], widget["y"]] if widget["type"] == "series" else widget["columns"]
+        return PlannedRequest(self, catalog, snapshot, filter_values, {}).page(widget["source"], columns, offset, limit)
+
+
+class PlannedRequest:
+    # One /get-data/ request: resolved sources, filter indexes, filtered rows,
+    # filter options and grouped aggregates are memoized so widgets share them
+
+    def __init__(self, planner: WidgetPlanner, catalog: Catalog, snapshot, filter_values: dict[str, Any], params: dict[str, Any]):
+        self.planner = planner
+        self.catalog = catalog
+        self.snapshot = snapshot
+        self.filter_values = {k: v for k, v in filter_values.items() if v is not None}
+        self.params = params
+        self.plan = snapshot.filter_plan
+        self._frames = {}  # source -> frame
+        self._indexes = {}  # source -> DatasetIndex
+        self._filtered = {}  # source -> filtered frame
+        self._options = {}  # source -> filter options
+        self._grouped = {}  # (source, group column) -> {(column, agg): Series}
+        self.detail = {}  # "<section>.<key>" of reduced widgets -> rows behind them
+
+    def frame(self, source: str) -> pd.DataFrame:
+        if source in self._frames:
+            return self._frames[source]
+        catalog, snapshot = self.catalog, self.snapshot
+        definition = self.planner.sources.get(source, {"dataset": source})
+        inputs = self.planner.inputs(source)
+        if "dataset" in definition:
+            if definition["dataset"] not in snapshot:
+                raise MissingDataset(definition["dataset"])
+            frame = snapshot[definition["dataset"]]
+        elif "from" in definition:
+            parent = self.frame(definition["from"])
+            frame = catalog.get_view(source, inputs, lambda: select_rows(parent, definition), snapshot)
+        else:
+            left = self.frame(definition["join"]["left"])
+            right = self.frame(definition["join"]["right"])
+            with catalog.stage("merge") as stage:
+                frame = self.planner.joins[source].update(left, right, tuple(snapshot.versions.get(name) for name in inputs))
+                stage.rows = len(frame)
+        catalog.log(f"source {source}", lambda: f"{len(frame)} rows, columns {frame.columns.tolist()}\n{frame}")
+        self._frames[source] = frame
+        return frame
+
+    def index(self, source: str) -> DatasetIndex:
+        if source not in self._indexes:
+            self._indexes[source] = self.catalog.get_filter_index(source, self.planner.inputs(source), self.frame(source), self.snapshot)
+        return self._indexes[source]
+
+    def filtered(self, source: str) -> pd.DataFrame:
+        if source not in self._filtered:
+            frame, index = self.frame(source), self.index(source)
+            with self.catalog.stage("filter") as stage:
+                rows = index.filter_rows(self.filter_values, self.plan)
+                self._filtered[source] = frame if rows is None else frame.take(rows)
+                stage.rows = len(self._filtered[source])
+        return self._filtered[source]
+
+    def page(self, source: str, columns: list[str], offset: int, limit: int) -> tuple[pd.DataFrame, int]:
+        # Only the page's rows are taken from the frame, not every filtered row
+        frame, index = self.frame(source), self.index(source)
+        with self.catalog.stage("filter") as stage:
+            rows = index.filter_rows(self.filter_values, self.plan)
+            total = len(frame) if rows is None else len(rows)
+            positions = np.arange(offset, min(offset + limit, total)) if rows is None else rows[offset:offset + limit]
+            page = frame[columns].take(positions)
+            stage.rows = len(page)
+        return page, total
+
+    def options(self, source: str) -> dict[str, list]:
+        if source not in self._options:
+            index = self.index(source)
+            with self.catalog.stage("filter_options"):
+                self._options[source] = index.filter_options(self.filter_values, self.plan)
+            self.catalog.log(f"filter options {source}", lambda: self._options[source])
+        return self._options[source]
+
+    def grouped(self, source: str, by: str) -> dict[tuple[str, str], pd.Series]:
+        # Every aggregate any widget needs from `source` grouped by `by`, in one pass
+        key = (source, by)
+        if key in self._grouped:
+            return self._grouped[key]
+        needed = list(dict.fromkeys(
+            (aggregate["column"], aggregate["agg"])
+            for widget in self.planner.widgets
+            if widget["type"] == "aggregate" and widget["source"] == source and by in self.planner.group_choices(widget["group_by"])
+            for aggregate in widget["aggregates"]
+        ))
+        results = None
+        if self.planner.cube_ready[source]:
+            # Partial sums and counts per filter value and group column; filters
+            # on columns the cube doesn't cover fall back to the rows
+            groups, measures = self.planner.cube_layouts[source]
+            cube = self.catalog.get_rollup_cube(source, self.planner.inputs(source), self.frame(source), groups, measures, self.snapshot)
+            if cube.can_answer(self.filter_values, self.plan):
+                with self.catalog.stage("groupby") as stage:
+                    rollup = cube.rollup(self.filter_values, by)
+                    if rollup is not None:
+                        stage.rows = len(rollup)
+                        results = {}
+                        for column, agg in needed:
+                            if agg == "mean":
+                                results[(column, agg)] = rollup[f"{column} sum"] / rollup[f"{column} count"]
+                            else:
+                                results[(column, agg)] = rollup[f"{column} {agg}"]
+        if results is None:
+            filtered = self.filtered(source)
+            with self.catalog.stage("groupby") as stage:
+                grouped = filtered.groupby(by, observed=True)
+                results = {(column, agg): getattr(grouped[column], agg)() for column, agg in needed}
+                stage.rows = grouped.ngroups
+        self._grouped[key] = results
+        return results
+
+    def aggregate(self, widget: dict) -> pd.DataFrame:
+        group_by = widget["group_by"]
+        by = self.params[group_by[1:]] if group_by.startswith("$") else group_by
+        results = self.grouped(widget["source"], by)
+        columns = []
+        for aggregate in widget["aggregates"]:
+            series = results[(aggregate["column"], aggregate["agg"])]
+            if by in self.planner.orders:
+                series = ordered(series, self.planner.orders[by])
+            if aggregate.get("pct_change"):
+                series = series.pct_change().mul(100)
+            if "round" in aggregate:
+                series = series.round(aggregate["round"])
+            if aggregate.get("pct_change"):
+                series = series.fillna(0)  # Avoid NaN in the first row
+            columns.append(series.rename(aggregate.get("as", aggregate["column"])))
+        frame = (pd.concat(columns, axis=1) if len(columns) > 1 else columns[0].to_frame()).rename_axis(by).reset_index()
+
+        if "share" in widget:
+            column = widget["share"]["column"]
+            frame[widget["share"].get("as", "percentage")] = (frame[column] / frame[column].sum()) * 100
+        if "round" in widget:
+            frame = frame.round(widget["round"])
+        if "rename" in widget:
+            frame = frame.rename(columns=widget["rename"])
+        if "top" in widget:
+            frame = frame.nlargest(widget["top"]["n"], widget["top"]["column"])
+        if "limit" in widget:
+            frame = frame.head(widget["limit"])
+        return frame
+
+    def widget(self, widget: dict) -> Any:
+        kind = widget["type"]
+        if kind == "aggregate":
+            return self.aggregate(widget)
+        if kind == "filter_options":
+            return self.options(widget["source"])
+        if kind == "date_range":
+            return summarize_dates(self.frame(widget["source"])[widget["column"]])
+        widget_id = f"{widget['section']}.{widget['key']}"
+        if kind == "series":
+            filtered = self.filtered(widget["source"])
+            with self.catalog.stage("downsample") as stage:
+                points = self.params.get("resolution") or widget.get("points", DEFAULT_POINTS)
+                series, total = downsample(filtered[[widget["x"], widget["y"]]], widget["x"], widget["y"], points, widget.get("method", "lttb"))
+                stage.rows = len(series)
+            self.detail[widget_id] = {"rows": total, "returned": len(series)}
+            return series
+        rows = self.filtered(widget["source"])[widget["columns"]]
+        if "top" in widget:
+            top = widget["top"]
+            self.detail[widget_id] = {"rows": len(rows), "returned": min(len(rows), top["n"])}
+            return top_with_other(rows, top["column"], top["n"], top.get("other"))
+        return rows
+
+    def run(self) -> dict[str, Any]:
+        # Widgets whose source needs a dataset that isn't loaded are left out
+        # (and the dataset is listed) instead of failing the whole dashboard
+        sections = {}
+        missing = []
+        rendered = 0
+        for widget in self.planner.widgets:
+            section = sections.setdefault(widget["section"], {})
+            try:
+                value = self.widget(widget)
+            except MissingDataset as e:
+                if e.args[0] not in missing:
+                    missing.append(e.args[0])
+                continue
+            rendered += 1
+            if widget["type"] == "filter_options":
+                section.update(value)
+            else:
+                section[widget["key"]] = value
+        if not rendered and self.planner.widgets:
+            return {"success": False, "error": f"Datasets not available: {', '.join(missing)}"}
+        result = {"success": True, **sections}
+        if self.detail:
+            result["detail"] = self.detail
+        if missing:
+            result["missing_datasets"] = missing
+        return result
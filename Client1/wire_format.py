@@ -0,0 +1,161 @@
+import gzip
+import json
+import math
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard json module
+    orjson = None
+try:
+    import brotli
+except ImportError:  # Only gzip is offered without brotli
+    brotli = None
+try:
+    import pyarrow as pa
+except ImportError:  # format=arrow is unavailable without pyarrow
+    pa = None
+
+
+# Response layouts for /get-data/?format=
+#   json:     the default layout (one object per row), encoded with orjson
+#   columnar: every table as {column: [values]} instead of a list of rows
+#   arrow:    Arrow IPC stream with a single row holding the whole response
+FORMATS = ("json", "columnar", "arrow")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def to_records(value: Any) -> Any:
+    # DataFrames anywhere in the result -> lists of row dicts (the default layout)
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict(orient="records")
+    if isinstance(value, dict):
+        return {k: to_records(v) for k, v in value.items()}
+    return value
+
+
+def column_values(series: pd.Series):
+    # Numbers stay numpy arrays (orjson writes them without a Python list in
+    # between), everything else becomes a list with None for missing values
+    if pd.api.types.is_numeric_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype):
+        if series.hasnans:
+            return series.to_numpy(dtype=np.float64, na_value=np.nan)
+        return series.to_numpy()
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def to_columnar(value: Any) -> Any:
+    if isinstance(value, pd.DataFrame):
+        return {str(column): column_values(value[column]) for column in value.columns}
+    if isinstance(value, dict):
+        return {k: to_columnar(v) for k, v in value.items()}
+    return value
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if value is pd.NA or value is pd.NaT:
+        return None
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _finite(value: Any) -> Any:
+    # NaN and infinities -> None, as orjson writes them; the json module would
+    # write a bare NaN, which JSON.parse rejects
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, np.ndarray):
+        return _finite(value.tolist()) if value.dtype.kind in "fcO" else value
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_finite(value), default=_json_default, separators=(",", ":"), allow_nan=False).encode()
+
+
+def _arrow_array(value: Any):
+    # Length-1 Arrow array holding `value`: tables become list<struct> columns,
+    # dicts become structs, lists and scalars are converted as they are
+    if isinstance(value, pd.DataFrame):
+        table = pa.Table.from_pandas(value, preserve_index=False).combine_chunks()
+        columns = [column.chunk(0) if column.num_chunks else pa.array([], type=column.type) for column in table.columns]
+        rows = pa.StructArray.from_arrays(columns, names=table.column_names) if columns else pa.array([{}] * len(value))
+        return pa.ListArray.from_arrays(pa.array([0, len(rows)], type=pa.int32()), rows)
+    if isinstance(value, dict):
+        if not value:
+            return pa.array([None], type=pa.null())
+        fields = {str(k): _arrow_array(v) for k, v in value.items()}
+        return pa.StructArray.from_arrays(list(fields.values()), names=list(fields))
+    try:
+        return pa.array([value])
+    except (pa.ArrowInvalid, pa.ArrowTypeError):  # Mixed types, e.g. filter options of numbers and strings
+        return pa.array([[str(v) for v in value] if isinstance(value, list) else str(value)])
+
+
+def to_arrow(value: dict) -> bytes:
+    if pa is None:
+        raise RuntimeError("format=arrow needs pyarrow installed")
+    columns = {str(k): _arrow_array(v) for k, v in value.items()}
+    batch = pa.RecordBatch.from_arrays(list(columns.values()), names=list(columns))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    # Best encoding the client accepts: brotli, then gzip (q=0 means refused)
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    for encoding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: Optional[str]) -> tuple[bytes, Optional[str]]:
+    if encoding is None or len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+
+
+def render(result: dict, fmt: str, accept_encoding: Optional[str]) -> tuple[bytes, str, dict[str, str]]:
+    # (body, media type, headers) of a /get-data/ result in the requested format
+    if fmt == "arrow":
+        body, media_type = to_arrow(result), ARROW_MEDIA_TYPE
+    elif fmt == "columnar":
+        body, media_type = dumps(to_columnar(result)), "application/json"
+    else:
+        body, media_type = dumps(to_records(result)), "application/json"
+    body, encoding = compress(body, choose_encoding(accept_encoding))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return body, media_type, headers
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The server modules import each other as top-level modules (they run from
+# Client1/), and script.py sits at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "Client1")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
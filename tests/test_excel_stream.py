@@ -0,0 +1,90 @@
+from datetime import datetime, time
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from excel_stream import list_sheets, read_excel_file, read_excel_streaming
+
+
+def write_workbook(path, sheets):
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for title, rows in sheets.items():
+        worksheet = workbook.create_sheet(title)
+        for row in rows:
+            worksheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+PRICES = [
+    ["Date", "Gold Price", "Volume", "Note", "Ratio"],
+    [datetime(2020, 1, 1), 1500.5, 10, "a", 0.5],
+    [datetime(2020, 1, 2), 1510, 12, None, 1],
+    [None, None, None, "only a note", None],
+    [datetime(2020, 1, 3), 1490.25, 9, "c", 2],
+]
+MORE_PRICES = [
+    ["Date", "Gold Price", "Extra"],
+    [datetime(2021, 6, 1), 1800, "x"],
+    [datetime(2021, 6, 2), 1810.75, None],
+]
+
+
+@pytest.mark.parametrize("sheets", [
+    {"Prices": PRICES},
+    {"Prices": PRICES, "More": MORE_PRICES},
+    {"Times": [["Name", "At"], ["open", time(9, 30)], ["close", time(17, 0)]]},
+    {"Repeats": [["A", "A", None], [1, 2, 3], [4, 5, 6]]},
+])
+def test_streaming_matches_pd_read_excel(tmp_path, sheets):
+    path = write_workbook(tmp_path / "book.xlsx", sheets)
+    streamed = read_excel_file(path, list(sheets), mode="streaming")
+    expected = pd.concat(pd.read_excel(path, sheet_name=list(sheets)).values(), ignore_index=True)
+    # Streamed columns use nullable dtypes (Int64, Float64, object with None),
+    # so values are compared with every kind of missing value as None
+    as_values = lambda df: df.astype(object).where(df.notna(), None)
+    pd.testing.assert_frame_equal(as_values(streamed), as_values(expected))
+    for column in expected.columns:
+        assert pd.api.types.is_numeric_dtype(streamed[column]) == pd.api.types.is_numeric_dtype(expected[column]), column
+        assert pd.api.types.is_datetime64_any_dtype(streamed[column]) == pd.api.types.is_datetime64_any_dtype(expected[column]), column
+
+
+def test_trailing_blank_rows_are_dropped_and_interior_ones_kept(tmp_path):
+    rows = [["A", "B"], [1, "x"], [None, None], [2, "y"], [None, None], [None, None]]
+    path = write_workbook(tmp_path / "book.xlsx", {"S": rows})
+    df, sheets = read_excel_streaming(path)
+    assert sheets == ["S"]
+    assert df["A"].tolist() == [1, pd.NA, 2]
+    assert df["B"].tolist() == ["x", None, "y"]
+
+
+def test_header_is_the_first_non_empty_row(tmp_path):
+    rows = [[None, None], ["A", "B"], [1, 2]]
+    path = write_workbook(tmp_path / "book.xlsx", {"S": rows})
+    df, _ = read_excel_streaming(path)
+    assert list(df.columns) == ["A", "B"]
+    assert df["A"].tolist() == [1]
+
+
+def test_rows_wider_than_the_header_get_unnamed_columns(tmp_path):
+    rows = [["A", "B"], [1, 2], [3, 4, "extra"]]
+    path = write_workbook(tmp_path / "book.xlsx", {"S": rows})
+    df, _ = read_excel_streaming(path)
+    assert list(df.columns) == ["A", "B", "Unnamed: 2"]
+    assert df["Unnamed: 2"].tolist() == [None, "extra"]
+
+
+def test_memory_cap(tmp_path):
+    rows = [["A"]] + [[f"value {i}"] for i in range(2000)]
+    path = write_workbook(tmp_path / "book.xlsx", {"S": rows})
+    with pytest.raises(ValueError, match="memory cap"):
+        read_excel_streaming(path, memory_cap_bytes=10000)
+
+
+def test_empty_sheets(tmp_path):
+    path = write_workbook(tmp_path / "book.xlsx", {"Empty": [], "Blank": [[None, None]]})
+    assert list_sheets(path) == ["Empty", "Blank"]
+    with pytest.raises(ValueError, match="No data found"):
+        read_excel_streaming(path)
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from filter_index import ColumnIndex, DatasetIndex, FilterPlan
+
+
+CONFIG = [
+    {"id": "sym", "column": "sym", "depends_on": ["sector"]},
+    {"id": "sector", "column": "sector"},
+    {"id": "year", "column": "Year"},
+]
+
+
+def baseline_filter(df, filter_values, filter_config):
+    # The row selection get_data made before the indexes: isin for lists, == str(value) otherwise
+    filtered = df
+    for config in filter_config:
+        column = config["column"]
+        values = filter_values.get(column)
+        if values and values != "All" and column in df.columns:
+            if isinstance(values, list):
+                filtered = filtered[filtered[column].isin(values)]
+            else:
+                filtered = filtered[filtered[column] == str(values)]
+    return filtered
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(7)
+    n = 500
+    df = pd.DataFrame({
+        "sector": rng.choice(["Tech", "Energy", "Health", None], n),
+        "sym": [f"S{i:03d}" for i in rng.integers(0, 40, n)],
+        "Year": rng.choice(["2001", "2002", "2003", ""], n),
+        "value": rng.random(n),
+    })
+    df.loc[df.index[::17], "sym"] = None
+    return df
+
+
+def test_plan_orders_parents_before_children():
+    plan = FilterPlan(CONFIG)
+    order = [column for column, parents in plan.filters]
+    assert sorted(order) == ["Year", "sector", "sym"]
+    assert order.index("sector") < order.index("sym")
+    assert dict(plan.filters)["sym"] == ("sector",)
+
+
+def test_plan_rejects_a_cycle():
+    config = [
+        {"id": "a", "column": "A", "depends_on": ["b"]},
+        {"id": "b", "column": "B", "depends_on": ["a"]},
+    ]
+    with pytest.raises(ValueError, match="cycle"):
+        FilterPlan(config)
+
+
+def test_plan_rejects_an_unknown_dependency():
+    with pytest.raises(ValueError, match="unknown filter 'nope'"):
+        FilterPlan([{"id": "a", "column": "A", "depends_on": ["nope"]}])
+
+
+@pytest.mark.parametrize("values", [
+    ["Tech"],
+    ["Tech", "Energy"],
+    ["Energy", "Tech", "Tech"],
+    ["Nope"],
+    ["Tech", "Nope"],
+    [],
+])
+def test_column_index_matches_isin(frame, values):
+    index = ColumnIndex(frame["sector"])
+    expected = np.flatnonzero(frame["sector"].isin(values).to_numpy())
+    np.testing.assert_array_equal(index.rows_for(values), expected)
+
+
+def test_column_index_never_selects_missing_values(frame):
+    index = ColumnIndex(frame["sym"])
+    rows = index.rows_for(index.values + [None])
+    np.testing.assert_array_equal(rows, np.flatnonzero(frame["sym"].notna().to_numpy()))
+    assert None not in index.options()
+
+
+def test_column_index_options_are_sorted_and_distinct(frame):
+    index = ColumnIndex(frame["Year"])
+    assert index.options() == sorted(frame["Year"].dropna().unique().tolist())
+    rows = np.flatnonzero((frame["sector"] == "Tech").to_numpy())
+    assert index.options(rows) == sorted(frame.loc[frame["sector"] == "Tech", "Year"].unique().tolist())
+
+
+def test_column_index_mixed_types_fall_back_to_string_order():
+    index = ColumnIndex(pd.Series([3, "b", 1, "a", 3], dtype=object))
+    assert index.values == [1, 3, "a", "b"]
+    np.testing.assert_array_equal(index.rows_for([3]), [0, 4])
+
+
+@pytest.mark.parametrize("filter_values", [
+    {},
+    {"sector": "Tech"},
+    {"sector": ["Tech", "Health"], "Year": "2002"},
+    {"sector": "All", "Year": ["2001", "2003"]},
+    {"sym": ["S001", "S002", "S001"], "sector": []},
+    {"sector": "Nope"},
+    {"Missing column": "x", "Year": "2001"},
+])
+def test_dataset_index_matches_baseline_filter(frame, filter_values):
+    plan = FilterPlan(CONFIG)
+    rows = DatasetIndex(frame, plan).filter_rows(filter_values, plan)
+    selected = frame if rows is None else frame.take(rows)
+    pd.testing.assert_frame_equal(selected, baseline_filter(frame, filter_values, CONFIG))
+
+
+def test_filter_options_follow_parent_selection(frame):
+    plan = FilterPlan(CONFIG)
+    options = DatasetIndex(frame, plan).filter_options({"sector": "Energy", "Year": "2001"}, plan)
+    energy = frame[frame["sector"] == "Energy"]
+    # sym depends on sector only; sector and Year depend on nothing
+    assert options["sym_options"] == sorted(energy["sym"].dropna().unique().tolist())
+    assert options["sector_options"] == sorted(frame["sector"].dropna().unique().tolist())
+    assert options["year_options"] == sorted(frame["Year"].unique().tolist())
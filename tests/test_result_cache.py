@@ -0,0 +1,76 @@
+import pytest
+
+import result_cache
+from result_cache import etag_matches, make_cache_key, make_cursor, make_etag, read_cursor
+
+
+VERSIONS = {"googlesheet1": 3, "googlesheet2": 5}
+OPTIONS = ("year", 1000, "spec")
+
+
+def key(filter_values, versions=VERSIONS, config_hash="cfg", options=OPTIONS):
+    return make_cache_key(versions, config_hash, filter_values, options)
+
+
+@pytest.mark.parametrize("a, b", [
+    ({"sector": ["Tech", "Energy"]}, {"sector": ["Energy", "Tech"]}),
+    ({"sector": "All"}, {}),
+    ({"sector": [], "Year": ""}, {}),
+    ({"sector": "Tech", "Year": "2001"}, {"Year": "2001", "sector": "Tech"}),
+    ({"Year": [2001, "2002"]}, {"Year": ["2002", 2001]}),
+])
+def test_equivalent_filters_share_a_key(a, b):
+    assert key(a) == key(b)
+    assert make_etag(key(a), None) == make_etag(key(b), None)
+
+
+@pytest.mark.parametrize("other", [
+    key({"sector": "Energy"}),
+    key({"sector": "Tech"}, versions={**VERSIONS, "googlesheet2": 6}),
+    key({"sector": "Tech"}, config_hash="other"),
+    key({"sector": "Tech"}, options=("month", 1000, "spec")),
+])
+def test_anything_that_changes_the_answer_changes_the_key(other):
+    assert key({"sector": "Tech"}) != other
+    assert make_etag(key({"sector": "Tech"}), None) != make_etag(other, None)
+
+
+def test_version_order_does_not_matter():
+    assert key({}, versions={"b": 1, "a": 2}) == key({}, versions={"a": 2, "b": 1})
+
+
+def test_etag_differs_per_format_only():
+    k = key({"sector": "Tech"})
+    assert make_etag(k, None) == make_etag(k, None)
+    assert make_etag(k, None) != make_etag(k, "columnar")
+    assert make_etag(k, None).startswith('W/"')
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    ("{etag}", True),
+    ("{strong}", True),
+    ('"other", {etag}', True),
+    ("*", True),
+    ('W/"other"', False),
+])
+def test_etag_matches(if_none_match, matches):
+    etag = make_etag(key({}), None)
+    header = if_none_match.format(etag=etag, strong=etag.removeprefix("W/"))
+    assert etag_matches(header, etag) is matches
+
+
+def test_etags_and_cursors_change_across_restarts(monkeypatch):
+    k = key({})
+    etag, cursor = make_etag(k, None), make_cursor(k, 500)
+    assert read_cursor(cursor, k) == 500
+    monkeypatch.setattr(result_cache, "BOOT_EPOCH", "restarted")
+    assert make_etag(k, None) != etag
+    assert read_cursor(cursor, k) is None
+
+
+def test_cursor_is_bound_to_its_key():
+    cursor = make_cursor(key({"sector": "Tech"}), 100)
+    assert read_cursor(cursor, key({"sector": "Tech"})) == 100
+    assert read_cursor(cursor, key({"sector": "Energy"})) is None
+    with pytest.raises(ValueError):
+        read_cursor("not a cursor", key({}))
@@ -0,0 +1,111 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import script
+from script import SalesTotals, file_fingerprint, iter_chunks, process_file
+
+
+def baseline_result(df):
+    # What process_file computed before streaming: one groupby over the whole frame
+    aggregated = df.groupby("Category")["Value"].sum().reset_index().to_dict(orient="records")
+    return json.loads(json.dumps({
+        "total_sales": df["Value"].sum(),
+        "aggregated_data": [{"name": row["Category"], "value": row["Value"]} for row in aggregated],
+    }, default=lambda value: value.item()))
+
+
+def streamed_result(path, chunk_rows):
+    totals = SalesTotals()
+    for categories, values in iter_chunks(path, chunk_rows=chunk_rows):
+        totals.add_chunk(categories, values)
+    return json.loads(json.dumps(totals.result()))
+
+
+def sales_frame(n, floats=False, missing=False):
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        "Category": rng.choice(["Books", "Games", "Music", "Toys"], n),
+        "Value": rng.integers(1, 100, n),
+        "Region": rng.choice(["N", "S"], n),
+    })
+    if floats:
+        df["Value"] = df["Value"] + 0.25
+    if missing:
+        df.loc[df.index[::11], "Value"] = np.nan
+        df.loc[df.index[::13], "Category"] = None
+    return df
+
+
+@pytest.mark.parametrize("floats, missing", [(False, False), (True, False), (False, True)])
+@pytest.mark.parametrize("extension", [".csv", ".xlsx"])
+def test_chunked_totals_match_one_groupby(tmp_path, extension, floats, missing):
+    df = sales_frame(250, floats, missing)
+    path = str(tmp_path / f"sales{extension}")
+    if extension == ".csv":
+        df.to_csv(path, index=False)
+        expected = baseline_result(pd.read_csv(path))
+    else:
+        df.to_excel(path, index=False)
+        expected = baseline_result(pd.read_excel(path))
+    for chunk_rows in (7, 100, 1000):
+        assert streamed_result(path, chunk_rows) == expected
+    assert json.loads(process_file(path)) == expected
+
+
+def test_integer_sums_stay_integers(tmp_path):
+    path = str(tmp_path / "sales.csv")
+    sales_frame(50).to_csv(path, index=False)
+    result = streamed_result(path, 7)
+    assert isinstance(result["total_sales"], int)
+    assert all(isinstance(row["value"], int) for row in result["aggregated_data"])
+
+
+def test_merged_totals_equal_one_pass(tmp_path):
+    df = sales_frame(120, missing=True)
+    first, second = str(tmp_path / "a.csv"), str(tmp_path / "b.csv")
+    df.iloc[:70].to_csv(first, index=False)
+    df.iloc[70:].to_csv(second, index=False)
+    merged = SalesTotals()
+    for path in (first, second):
+        totals = SalesTotals()
+        for categories, values in iter_chunks(path, chunk_rows=9):
+            totals.add_chunk(categories, values)
+        merged.merge(totals)
+    whole = str(tmp_path / "whole.csv")
+    df.to_csv(whole, index=False)
+    assert json.loads(json.dumps(merged.result())) == baseline_result(pd.read_csv(whole))
+
+
+def test_workbook_with_a_blank_first_row(tmp_path):
+    workbook = Workbook()
+    worksheet = workbook.active
+    for row in ([None], ["Category", "Value"], ["Books", 3], [None, None], ["Toys", 4], ["Books", 5]):
+        worksheet.append(row)
+    path = str(tmp_path / "blank.xlsx")
+    workbook.save(path)
+    result = streamed_result(path, 2)
+    assert result["aggregated_data"] == [{"name": "Books", "value": 8.0}, {"name": "Toys", "value": 4.0}]
+    assert result["total_sales"] == 12.0
+
+
+def test_missing_columns_are_reported(tmp_path):
+    path = str(tmp_path / "sales.csv")
+    pd.DataFrame({"Category": ["a"], "Amount": [1]}).to_csv(path, index=False)
+    assert "error" in json.loads(process_file(path))
+
+
+def test_fingerprint_ignores_touches_but_not_edits(tmp_path, monkeypatch):
+    monkeypatch.setattr(script, "_digests", {})
+    path = tmp_path / "sales.csv"
+    path.write_text("Category,Value\na,1\n")
+    before = file_fingerprint(str(path))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert file_fingerprint(str(path)) == before
+    path.write_text("Category,Value\na,2\n")
+    assert file_fingerprint(str(path)) != before
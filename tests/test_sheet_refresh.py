@@ -0,0 +1,127 @@
+import pandas as pd
+import pytest
+
+from fake_sheets import FakeSheetsService
+from sheet_refresh import SheetState, hash_rows, refresh_sheet
+from sheets_fetcher import SheetsFetcher, values_to_dataframe
+
+
+BLOCK_ROWS = 10
+
+
+def make_rows(n):
+    return [["Date", "Price", "Note"]] + [[f"2020-01-{i % 28 + 1:02d}", str(i), f"n{i}"] for i in range(n)]
+
+
+def normalize(df):
+    return df.assign(Price=pd.to_numeric(df["Price"]))
+
+
+@pytest.fixture
+def sheet():
+    data = {"sid": {"P": make_rows(95)}}
+    return data, FakeSheetsService(data, grid_rows=200)
+
+
+def fetcher_for(service, drive=True):
+    return SheetsFetcher(
+        lambda: service, "sid", "P", block_rows=BLOCK_ROWS, max_workers=2, backoff_seconds=0,
+        drive_factory=(lambda: service) if drive else None,
+    )
+
+
+def load(service):
+    # A full fetch, as ingest_google_sheet stores it
+    fetcher = fetcher_for(service)
+    revision = fetcher.revision()
+    header, rows = fetcher.fetch_all()
+    return normalize(values_to_dataframe(header, rows)), SheetState("sid", "P", header, hash_rows(rows), revision)
+
+
+def expected(data):
+    rows = data["sid"]["P"]
+    return normalize(values_to_dataframe(rows[0], rows[1:]))
+
+
+def test_unchanged_sheet_downloads_nothing(sheet):
+    data, service = sheet
+    stored, state = load(service)
+    before = service.cells_returned
+    fetcher = fetcher_for(service)
+    df, new_state, report = refresh_sheet(fetcher, state, stored, normalize, "auto", fetcher.revision())
+    assert df is stored
+    assert report["mode"] == "unchanged"
+    assert report["rows_unchanged"] == 95
+    assert service.cells_returned == before
+
+
+@pytest.mark.parametrize("row", [0, 4, 37, 94])
+def test_auto_picks_up_an_edit_in_any_block(sheet, row):
+    data, service = sheet
+    stored, state = load(service)
+    data["sid"]["P"][row + 1][1] = "12345"
+    fetcher = fetcher_for(service)
+    df, new_state, report = refresh_sheet(fetcher, state, stored, normalize, "auto", fetcher.revision())
+    assert report["rows_changed"] == 1
+    assert report["rows_unchanged"] == 94
+    assert report["not_checked"] == 0
+    pd.testing.assert_frame_equal(df, expected(data))
+    # The new state matches the new revision: the next refresh skips again
+    fetcher = fetcher_for(service)
+    assert refresh_sheet(fetcher, new_state, df, normalize, "auto", fetcher.revision())[2]["mode"] == "unchanged"
+
+
+def test_auto_without_a_revision_verifies_every_block(sheet):
+    data, service = sheet
+    stored, state = load(service)
+    data["sid"]["P"][3][2] = "edited"
+    fetcher = fetcher_for(service, drive=False)
+    df, new_state, report = refresh_sheet(fetcher, state, stored, normalize, "auto", fetcher.revision())
+    assert report["mode"] == "verify"
+    assert report["blocks_fetched"] >= 10
+    assert report["rows_changed"] == 1
+    pd.testing.assert_frame_equal(df, expected(data))
+
+
+def test_appended_and_removed_rows(sheet):
+    data, service = sheet
+    stored, state = load(service)
+    data["sid"]["P"].extend(make_rows(110)[96:])
+    fetcher = fetcher_for(service)
+    df, state, report = refresh_sheet(fetcher, state, stored, normalize, "auto", fetcher.revision())
+    assert (report["rows_added"], report["rows_removed"]) == (15, 0)
+    pd.testing.assert_frame_equal(df, expected(data))
+
+    del data["sid"]["P"][-20:]
+    fetcher = fetcher_for(service)
+    df, state, report = refresh_sheet(fetcher, state, df, normalize, "auto", fetcher.revision())
+    assert (report["rows_added"], report["rows_removed"]) == (0, 20)
+    pd.testing.assert_frame_equal(df, expected(data))
+
+
+def test_append_mode_reports_rows_it_did_not_check(sheet):
+    data, service = sheet
+    stored, state = load(service)
+    data["sid"]["P"][2][1] = "999"  # Block 0, never fetched by "append"
+    data["sid"]["P"].append(["2020-02-01", "7", "new"])
+    fetcher = fetcher_for(service)
+    df, new_state, report = refresh_sheet(fetcher, state, stored, normalize, "append", fetcher.revision())
+    assert report["mode"] == "append"
+    assert report["rows_added"] == 1
+    assert report["not_checked"] == 90
+    assert report["rows_unchanged"] == 5
+    assert df["Price"].iloc[1] == 1  # The early edit is not seen
+    # ...so the state can't vouch for the revision, and auto verifies next time
+    assert new_state.revision is None
+    fetcher = fetcher_for(service)
+    df, new_state, report = refresh_sheet(fetcher, new_state, df, normalize, "auto", fetcher.revision())
+    assert report["rows_changed"] == 1
+    pd.testing.assert_frame_equal(df, expected(data))
+
+
+def test_changed_header_needs_a_full_reload(sheet):
+    data, service = sheet
+    stored, state = load(service)
+    data["sid"]["P"][0][2] = "Comment"
+    fetcher = fetcher_for(service)
+    assert refresh_sheet(fetcher, state, stored, normalize, "auto", fetcher.revision()) is None
@@ -0,0 +1,19 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import wire_format
+from wire_format import dumps, to_columnar
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_non_finite_numbers_are_written_as_null(monkeypatch, use_orjson):
+    if use_orjson and wire_format.orjson is None:
+        pytest.skip("orjson is not installed")
+    if not use_orjson:
+        monkeypatch.setattr(wire_format, "orjson", None)
+    table = pd.DataFrame({"x": [1.5, np.nan, np.inf], "n": [1, 2, 3], "s": ["a", None, "c"]})
+    body = dumps({"table": to_columnar(table), "ratio": float("nan")})
+    assert json.loads(body) == {"table": {"x": [1.5, None, None], "n": [1, 2, 3], "s": ["a", None, "c"]}, "ratio": None}